@@ -0,0 +1,381 @@
+"""Offline benchmarks of the agent and of the graph operations.
+
+    python scripts/benchmark.py agent --sizes 2000,20000 --latency 0.05
+    python scripts/benchmark.py graph --sizes 1000,10000,100000,1000000
+    python scripts/benchmark.py imports
+
+The agent benchmark runs LlmAgent end to end on synthetic corpora, with the
+LLM replaced by a deterministic fake chat model that replays recorded
+completions or synthesizes the edges of each chunk after a fixed latency.
+The graph benchmark times the main Graph operations on synthetic graphs, and
+the imports benchmark fails when a module exceeds its cold-start budget.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from langchain_core.callbacks import (  # noqa: E402
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel  # noqa: E402
+from langchain_core.messages import AIMessage, BaseMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatResult  # noqa: E402
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+from langchain_core.utils.function_calling import convert_to_openai_tool  # noqa: E402
+
+from sumo.agent import LlmAgent, llms  # noqa: E402
+from sumo.schemas import Edge, Graph, Node, Ontology  # noqa: E402
+from sumo.settings import config  # noqa: E402
+
+logger = logging.getLogger("benchmark")
+
+_FIRST_NAMES = ["Alba", "Bruno", "Carla", "Dario", "Elena", "Fabio", "Giulia", "Ivo"]
+_LAST_NAMES = ["Rossi", "Bianchi", "Ferrari", "Russo", "Gallo", "Costa", "Greco"]
+_COMPANIES = ["Acme", "Orbis", "Vela", "Nimbus", "Quadra", "Lumen", "Serra"]
+_RELATIONSHIPS = ["works with", "manages", "advises", "reports to", "is employed by"]
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "ba", "de", "fu"]
+_ENTITY = re.compile(r"[A-Z][a-z]+(?: [A-Z][a-z]+)*")
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model: replays the recorded completion of a query, or
+    answers after `latency` seconds with the edges between the entities of each
+    sentence of the text to extract"""
+
+    latency: float = 0.0
+    edges_per_chunk: int = 20
+    recordings: Dict[str, str] = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "sumo-fake"
+
+    def _complete(self, messages: List[BaseMessage], **kwargs: Any) -> AIMessage:
+        system = messages[0].content if messages[0].type == "system" else ""
+        query = messages[-1].content
+
+        if kwargs.get("structured"):
+            route = "investigate_kg" if query.rstrip().endswith("?") else "direct_llm"
+            if "Extract" in query or len(query) > 200:
+                route = "generate_kg"
+            content = json.dumps({"source": route})
+        elif query in self.recordings:
+            content = self.recordings[query]
+        elif "Extract all the entities" in system:
+            content = json.dumps(
+                {"edges": synthesize_edges(query, self.edges_per_chunk)}
+            )
+        else:
+            content = f"Answer to: {query[:80]}"
+
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        completion_tokens = len(content) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        return AIMessage(content=content, response_metadata={"token_usage": usage})
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        message = self._complete(messages, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        message = self._complete(messages, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def bind_tools(self, tools: list, **kwargs: Any) -> Any:
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools])
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Any:
+        return self.bind(structured=True) | RunnableLambda(
+            lambda message: json.loads(message.content)
+        )
+
+
+def synthesize_edges(text: str, max_edges: int) -> list[dict]:
+    edges = []
+    for sentence in re.split(r"(?<=\.)\s+", text):
+        entities = _ENTITY.findall(sentence)
+        if len(entities) < 2:
+            continue
+        relationship = sentence.split(entities[0], 1)[1].split(entities[1], 1)[0]
+        edges.append(
+            {
+                "node_1": {"label": _label(entities[0]), "name": entities[0]},
+                "node_2": {"label": _label(entities[1]), "name": entities[1]},
+                "relationship": relationship.strip() or "related to",
+            }
+        )
+        if len(edges) == max_edges:
+            break
+    return edges
+
+
+def _label(name: str) -> str:
+    return "Organization" if name.split()[0] in _COMPANIES else "Person"
+
+
+def install_fake_llm(model: FakeChatModel) -> None:
+    # chains are built on first use, so they all get the fake model
+    config.LLM_CACHE_PATH = None
+    llms.get_llm = lambda *args, **kwargs: model
+
+
+def synthetic_corpus(n_words: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    people = [f"{first} {last}" for first in _FIRST_NAMES for last in _LAST_NAMES]
+    companies = [f"{name} Group" for name in _COMPANIES]
+
+    sentences, n = [], 0
+    while n < n_words:
+        entity_1 = rng.choice(people)
+        entity_2 = rng.choice(people + companies)
+        sentence = f"{entity_1} {rng.choice(_RELATIONSHIPS)} {entity_2} since {rng.randint(1990, 2024)}."
+        sentences.append(sentence)
+        n += len(sentence.split())
+    return " ".join(sentences)
+
+
+def synthetic_edges(n_edges: int, n_names: int, seed: int = 0) -> list[Edge]:
+    rng = random.Random(seed)
+    names = [
+        " ".join("".join(rng.choices(_SYLLABLES, k=3)).capitalize() for _ in range(2))
+        for _ in range(n_names)
+    ]
+    labels = ["Person", "Organization", "Place", "Document"]
+
+    def node() -> Node:
+        return Node.model_construct(label=rng.choice(labels), name=rng.choice(names))
+
+    return [
+        Edge.model_construct(
+            node_1=node(), node_2=node(), relationship=rng.choice(_RELATIONSHIPS)
+        )
+        for _ in range(n_edges)
+    ]
+
+
+def timed(function: Any, *args: Any, **kwargs: Any) -> float:
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def benchmark_agent(args: argparse.Namespace) -> list[dict]:
+    model = FakeChatModel(latency=args.latency, edges_per_chunk=args.edges_per_chunk)
+    if args.recordings:
+        with open(args.recordings) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        model.recordings = {record["query"]: record["completion"] for record in records}
+    install_fake_llm(model)
+    if args.chunk_tokens:
+        config.CHUNK_TOKENS_LIMIT = args.chunk_tokens
+    ontology = Ontology(labels=["Person", "Organization"], relationships=[])
+
+    results = []
+    for size in args.sizes:
+        agent = LlmAgent(ontology=ontology, kg=Graph(edges=[]))
+        corpus = synthetic_corpus(size)
+        start = time.perf_counter()
+        state = agent.run(corpus, max_workers=args.workers)
+        seconds = time.perf_counter() - start
+
+        totals = state["metrics"].totals()
+        llm_calls = sum(total["llm_calls"] for total in totals.values())
+        steps_seconds = sum(total["seconds"] for total in totals.values())
+        result = {
+            "benchmark": "agent.run",
+            "words": size,
+            "workers": args.workers,
+            "chunks": state["chunks"],
+            "edges": len(state["kg"].edges),
+            "seconds": seconds,
+            "chunks_per_second": state["chunks"] / seconds,
+            "edges_per_second": len(state["kg"].edges) / seconds,
+            # time spent outside of the (fake) LLM latency, per chunk
+            "overhead_per_chunk": (steps_seconds - llm_calls * args.latency)
+            / state["chunks"],
+            "steps": {
+                step: total["seconds"] / total["count"]
+                for step, total in totals.items()
+            },
+        }
+        results.append(result)
+        print(
+            f"agent.run {size:>8} words: {state['chunks']:>5} chunks, "
+            f"{result['edges']:>6} edges in {seconds:7.2f}s "
+            f"({result['chunks_per_second']:8.1f} chunks/s, "
+            f"{result['edges_per_second']:9.1f} edges/s, "
+            f"{1000 * result['overhead_per_chunk']:7.2f}ms overhead/chunk)"
+        )
+    return results
+
+
+def benchmark_graph(args: argparse.Namespace) -> list[dict]:
+    # pandas and pyvis are imported on first use, outside of the timings
+    Graph(edges=synthetic_edges(10, n_names=10)).to_html()
+
+    results = []
+    for size in args.sizes:
+        rng = random.Random(size)
+        edges = synthetic_edges(size, n_names=max(size // 5, 10), seed=size)
+        deltas = [
+            Graph(edges=edges[i : i + args.delta_size])
+            for i in range(0, size, args.delta_size)
+        ]
+
+        kg = Graph(edges=[])
+        times = {}
+        times["merge_edges"] = timed(lambda: [kg.merge_edges(d) for d in deltas])
+        times["get_nodes_list"] = timed(kg.get_nodes_list)
+        names = [rng.choice(edges).node_1.name for _ in range(100)]
+        times["get_node_relationships"] = (
+            timed(lambda: [kg.get_node_relationships(name) for name in names]) / 100
+        )
+        times["analytics"] = timed(lambda: kg.get_analytics().node_metrics())
+        times["to_pandas"] = timed(kg.to_pandas)
+        times["to_pandas (cached)"] = timed(kg.to_pandas)
+        extra = Graph(edges=synthetic_edges(5, n_names=10, seed=-size))
+        times["merge+to_pandas"] = timed(
+            lambda: (kg.merge_edges(extra), kg.to_pandas())
+        )
+        times["to_html"] = timed(kg.to_html, max_nodes=args.html_max_nodes)
+
+        result = {"benchmark": "graph", "edges": size, "stored": len(kg.edges)}
+        result.update(times)
+        results.append(result)
+        print(
+            f"graph {size:>8} edges: "
+            + ", ".join(f"{name} {1000 * t:.1f}ms" for name, t in times.items())
+        )
+    return results
+
+
+# cold-start budget of the modules, in seconds, and the heavy dependencies they
+# must not import
+_IMPORT_BUDGETS = {
+    "sumo.schemas": (0.5, ["pandas", "pyvis", "langchain_core", "langgraph"]),
+    "sumo.agent": (0.1, ["langchain_core", "langgraph", "langchain_openai"]),
+    "sumo.agent.agent": (2.0, ["pandas", "pyvis", "langchain_openai", "openai"]),
+    "sumo.ingest": (2.0, ["pandas", "pyvis", "langchain_openai", "openai"]),
+}
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def benchmark_imports(args: argparse.Namespace) -> list[dict]:
+    root = Path(__file__).resolve().parents[1]
+    results = []
+    for module, (budget, forbidden) in _IMPORT_BUDGETS.items():
+        script = _IMPORT_SCRIPT.format(module=module, forbidden=forbidden)
+        runs = [
+            json.loads(
+                subprocess.run(
+                    [sys.executable, "-c", script],
+                    cwd=root,
+                    capture_output=True,
+                    check=True,
+                    text=True,
+                ).stdout
+            )
+            for _ in range(args.repeat)
+        ]
+        seconds = min(run["seconds"] for run in runs)
+        loaded = runs[0]["loaded"]
+        result = {
+            "benchmark": "import",
+            "module": module,
+            "seconds": seconds,
+            "budget": budget,
+            "loaded": loaded,
+            "ok": seconds <= budget and not loaded,
+        }
+        results.append(result)
+        print(
+            f"import {module:<18} {1000 * seconds:7.1f}ms (budget {1000 * budget:.0f}ms)"
+            + (f", imports {', '.join(loaded)}" if loaded else "")
+            + ("" if result["ok"] else "  FAILED")
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--output", help="json file to write the results to")
+
+    agent = subparsers.add_parser(
+        "agent", parents=[common], help="end-to-end LlmAgent.run"
+    )
+    agent.add_argument("--sizes", default="1000,10000,50000", help="corpus words")
+    agent.add_argument("--latency", type=float, default=0.0, help="fake LLM seconds")
+    agent.add_argument("--workers", type=int, default=config.AGENT_MAX_WORKERS)
+    agent.add_argument("--edges-per-chunk", type=int, default=20)
+    agent.add_argument("--chunk-tokens", type=int, help="fixed size of the chunks")
+    agent.add_argument("--recordings", help="JSONL of recorded query/completion")
+
+    graph = subparsers.add_parser("graph", parents=[common], help="Graph operations")
+    graph.add_argument("--sizes", default="1000,10000,100000", help="graph edges")
+    graph.add_argument("--delta-size", type=int, default=1000)
+    graph.add_argument("--html-max-nodes", type=int, default=500)
+
+    imports = subparsers.add_parser(
+        "imports", parents=[common], help="cold-start import times, against budgets"
+    )
+    imports.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+    if hasattr(args, "sizes"):
+        args.sizes = [int(size) for size in args.sizes.split(",")]
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.benchmark == "agent":
+        results = benchmark_agent(args)
+    elif args.benchmark == "graph":
+        results = benchmark_graph(args)
+    else:
+        results = benchmark_imports(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if not all(result.get("ok", True) for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
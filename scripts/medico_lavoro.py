@@ -1,5 +1,4 @@
 import logging
-import pickle
 
 from sumo.agent import LlmAgent
 from sumo.schemas import Ontology
@@ -70,9 +69,7 @@ kg = agent_state["kg"]
 out_name = "graph"
 out_filepath = ".scratchpad/outputs/"
 
-out_pkl_filename = f"{out_filepath}{out_name}.pkl"
-with open(out_pkl_filename, "wb") as f:
-    pickle.dump(kg, f)
+kg.save(f"{out_filepath}{out_name}.kg")
 
 out_html_filename = f"{out_filepath}{out_name}.html"
 with open(out_html_filename, "w") as f:
@@ -1 +1,10 @@
-from sumo.agent.agent import LlmAgent
+# the agent, and the LLM stack it depends on, are imported on first access
+__all__ = ["LlmAgent"]
+
+
+def __getattr__(name: str):
+    if name == "LlmAgent":
+        from sumo.agent.agent import LlmAgent
+
+        return LlmAgent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,10 +1,24 @@
+import asyncio
+import itertools
+import json
 import logging
-from typing import Literal, TypedDict
-
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Iterable, Iterator, Literal, TypedDict
+
+from langchain_core.runnables import (
+    RunnableConfig,
+    RunnableLambda,
+    RunnableSerializable,
+)
 from langgraph.graph import END, StateGraph
 from langgraph.graph.graph import CompiledGraph
 
+from sumo.agent.cache import get_llm_cache
+from sumo.agent.checkpoint import RunCheckpoint, get_run_checkpoint
+from sumo.agent.chunking import chunk_text, get_tokenizer
 from sumo.agent.llms import (
     CustomOutput,
     direct_llm,
@@ -12,40 +26,109 @@ from sumo.agent.llms import (
     investigate_kg_llm,
     router_llm,
 )
-from sumo.agent.tools import get_explore_kg_tool
-from sumo.schemas import Graph, Ontology
+from sumo.agent.metrics import (
+    ChunkMetrics,
+    RunMetrics,
+    instrument,
+    record_chunk,
+    record_run,
+    record_step,
+)
+from sumo.agent.prompts import GENERATE_KG_SYSTEM_PROMPT
+from sumo.agent.tools import edge_text, get_kg_tools
+from sumo.schemas import Edge, Graph, Ontology
 from sumo.settings import config
 
 logger = logging.getLogger("llm")
 
+Route = Literal["generate_kg", "investigate_kg", "direct_llm"]
+
 
 class AgentState(TypedDict):
     query: str
     ontology: Ontology
     kg: Graph
+    kg_delta: Graph
     tool_calls: list[dict]
     sender: Literal["generate_kg", "investigate_kg"]
     explorations: dict[str, list[str]]
+    tool_results: dict[str, dict[str, list[str]]]
     generation: str
+    route: Route
+    chunks: int
+    chunk_metrics: ChunkMetrics
+    metrics: RunMetrics
 
 
-def input_router_edge(
-    state: AgentState,
-) -> Literal["generate_kg", "investigate_kg", "direct_llm"]:
-    logger.info("---ROUTER---")
-    query = state["query"]
+class AgentEvent(TypedDict, total=False):
+    """Progress event of a streamed agent run"""
 
-    llm = router_llm()
-    out = llm.invoke({"query": query})
+    event: Literal["start", "edges", "chunk", "end"]
+    chunk: int
+    route: Route | None
+    edges: list[Edge]
+    generation: str
+    state: AgentState
+
+
+def _route_source(out: dict) -> Route:
     source = out["source"]
 
-    logger.info(f"Routing to {source}\n")
     if source in ["generate_kg", "investigate_kg", "direct_llm"]:
         return source
     else:
         raise Exception(f"Router source {source} is not supported")
 
 
+def route_query(query: str) -> Route:
+    llm = router_llm()
+    return _route_source(llm.invoke({"query": query}))
+
+
+async def aroute_query(query: str) -> Route:
+    llm = router_llm()
+    return _route_source(await llm.ainvoke({"query": query}))
+
+
+def preroute_query(query: str, n_chunks: int) -> Route | None:
+    # a text spanning several chunks is a corpus to build the KG from, unless
+    # it is a (long) question about it
+    if n_chunks > 1 and not query.rstrip().endswith("?"):
+        return "generate_kg"
+    return None
+
+
+def nodes_context(kg: Graph, query: str) -> list[str]:
+    nodes = kg.get_relevant_nodes(query, k=config.PROMPT_NODES_LIMIT)
+    n_others = kg.get_nodes_count() - len(nodes)
+    if n_others > 0:
+        nodes.append(f"... and {n_others} other entities less related to the text")
+    return nodes
+
+
+def relationships_context(kg: Graph, query: str) -> list[str]:
+    [edges] = kg.search_edges([query], k=config.PROMPT_RELATIONSHIPS_LIMIT)
+    return [edge_text(edge) for edge in edges]
+
+
+@instrument("router")
+def input_router_edge(state: AgentState) -> Route:
+    logger.info("---ROUTER---")
+    source = state.get("route") or route_query(state["query"])
+
+    logger.info(f"Routing to {source}\n")
+    return source
+
+
+@instrument("router")
+async def ainput_router_edge(state: AgentState) -> Route:
+    logger.info("---ROUTER---")
+    source = state.get("route") or await aroute_query(state["query"])
+
+    logger.info(f"Routing to {source}\n")
+    return source
+
+
 def tool_router_edge(state: AgentState) -> Literal["call_tool", "__end__"]:
     tool_calls = state["tool_calls"]
 
@@ -54,45 +137,85 @@ def tool_router_edge(state: AgentState) -> Literal["call_tool", "__end__"]:
     return "__end__"
 
 
-def generate_kg_node(state: AgentState) -> AgentState:
-    _TEMPLATE_GENERATION = "KG correctly generated"
-
+def _generate_kg_request(state: AgentState) -> tuple[RunnableSerializable, dict]:
     logger.info("---GENERATE KG---")
     query = state["query"]
     ontology = state["ontology"]
     kg = state["kg"]
     explorations = state["explorations"]
 
-    llm = generate_kg_llm(kg)
-    output: CustomOutput = llm.invoke(
-        {
-            "query": query,
-            "ontology": str(ontology.dump()),
-            "nodes": kg.get_nodes_list(),
-            "explorations": explorations,
-        }
-    )
+    return generate_kg_llm(kg), {
+        "query": query,
+        "ontology": str(ontology.dump()),
+        "nodes": nodes_context(kg, query),
+        "explorations": explorations,
+    }
+
+
+def _generate_kg_result(output: CustomOutput) -> AgentState:
+    _TEMPLATE_GENERATION = "KG correctly generated"
 
     if output.type == "tool":
         logger.info(f"Tool calling: {output.tool_calls}\n")
         return AgentState(tool_calls=output.tool_calls, sender="generate_kg")
 
-    kg.merge_edges(output.pydantic_object)
     logger.info(f"Generated KG: {output.pydantic_object}\n")
-    return AgentState(kg=kg, generation=_TEMPLATE_GENERATION, tool_calls=[])
+    return AgentState(
+        kg_delta=output.pydantic_object,
+        generation=_TEMPLATE_GENERATION,
+        tool_calls=[],
+    )
 
 
-def investigate_kg_node(state: AgentState) -> AgentState:
+def _edges_listener(config: RunnableConfig) -> Callable[[list[Edge]], None] | None:
+    # generated edges are streamed only to a listener, and not when responses
+    # are cached as streaming bypasses the LLM cache
+    if get_llm_cache() is not None:
+        return None
+    return config.get("configurable", {}).get("on_edges")
+
+
+@instrument("generate_kg")
+def generate_kg_node(state: AgentState, config: RunnableConfig) -> AgentState:
+    llm, inputs = _generate_kg_request(state)
+    on_edges = _edges_listener(config)
+    if on_edges is None:
+        return _generate_kg_result(llm.invoke(inputs))
+
+    for output in llm.stream(inputs):
+        if output.type == "partial":
+            on_edges(output.pydantic_object.edges)
+    return _generate_kg_result(output)
+
+
+@instrument("generate_kg")
+async def agenerate_kg_node(state: AgentState, config: RunnableConfig) -> AgentState:
+    llm, inputs = _generate_kg_request(state)
+    on_edges = _edges_listener(config)
+    if on_edges is None:
+        return _generate_kg_result(await llm.ainvoke(inputs))
+
+    async for output in llm.astream(inputs):
+        if output.type == "partial":
+            on_edges(output.pydantic_object.edges)
+    return _generate_kg_result(output)
+
+
+def _investigate_kg_request(state: AgentState) -> tuple[RunnableSerializable, dict]:
     logger.info("---INVESTIGATE KG---")
     query = state["query"]
     kg = state["kg"]
     explorations = state["explorations"]
 
-    llm = investigate_kg_llm(kg)
-    output: CustomOutput = llm.invoke(
-        {"query": query, "nodes": kg.get_nodes_list(), "explorations": explorations}
-    )
+    return investigate_kg_llm(kg), {
+        "query": query,
+        "nodes": nodes_context(kg, query),
+        "relationships": relationships_context(kg, query),
+        "explorations": explorations,
+    }
+
 
+def _investigate_kg_result(output: CustomOutput) -> AgentState:
     if output.type == "tool":
         logger.info(f"Tool calling: {output.tool_calls}\n")
         return AgentState(tool_calls=output.tool_calls, sender="investigate_kg")
@@ -101,6 +224,19 @@ def investigate_kg_node(state: AgentState) -> AgentState:
     return AgentState(generation=output.str_generation, tool_calls=[])
 
 
+@instrument("investigate_kg")
+def investigate_kg_node(state: AgentState) -> AgentState:
+    llm, inputs = _investigate_kg_request(state)
+    return _investigate_kg_result(llm.invoke(inputs))
+
+
+@instrument("investigate_kg")
+async def ainvestigate_kg_node(state: AgentState) -> AgentState:
+    llm, inputs = _investigate_kg_request(state)
+    return _investigate_kg_result(await llm.ainvoke(inputs))
+
+
+@instrument("direct_llm")
 def direct_llm_node(state: AgentState) -> AgentState:
     logger.info("---DIRECT LLM---")
     query = state["query"]
@@ -112,83 +248,414 @@ def direct_llm_node(state: AgentState) -> AgentState:
     return AgentState(generation=generation)
 
 
+@instrument("direct_llm")
+async def adirect_llm_node(state: AgentState) -> AgentState:
+    logger.info("---DIRECT LLM---")
+    query = state["query"]
+
+    llm = direct_llm()
+    generation = await llm.ainvoke({"query": query})
+
+    logger.info(f"Generated answer: {generation}\n")
+    return AgentState(generation=generation)
+
+
+@instrument("explore_kg_tool")
 def explore_kg_tool_node(state: AgentState) -> AgentState:
     tool_calls = state["tool_calls"]
     kg = state["kg"]
 
-    explorations = {}
-    explore_kg_tool = get_explore_kg_tool(kg)
+    # explorations accumulate over the steps of a run, and the results of
+    # repeated calls are taken from the ones of the run
+    explorations = dict(state["explorations"])
+    tool_results = dict(state.get("tool_results") or {})
+    tools = {tool.name: tool for tool in get_kg_tools(kg, state["query"])}
     for call in tool_calls:
-        result = explore_kg_tool.invoke(call["args"])
-        explorations.update(result)
+        if call["name"] not in tools:
+            logger.warning(f"Unknown tool {call['name']}")
+            continue
+        key = json.dumps([call["name"], call["args"]], sort_keys=True)
+        if key not in tool_results:
+            tool_results[key] = tools[call["name"]].invoke(call["args"])
+        explorations.update(tool_results[key])
+
+    return AgentState(
+        tool_calls=[], explorations=explorations, tool_results=tool_results
+    )
+
+
+@lru_cache(maxsize=None)
+def compile_agent_graph() -> CompiledGraph:
+    """The agent graph, compiled once and shared by all the agents"""
+    graph = StateGraph(AgentState)
 
-    return AgentState(tool_calls=[], explorations=explorations)
+    # nodes
+    # LLM steps have an async implementation, used when the graph is run with
+    # ainvoke/astream
+    graph.add_node(
+        "generate_kg", RunnableLambda(generate_kg_node, afunc=agenerate_kg_node)
+    )
+    graph.add_node(
+        "investigate_kg",
+        RunnableLambda(investigate_kg_node, afunc=ainvestigate_kg_node),
+    )
+    graph.add_node(
+        "direct_llm", RunnableLambda(direct_llm_node, afunc=adirect_llm_node)
+    )
+    graph.add_node("explore_kg_tool", explore_kg_tool_node)
+
+    # edges
+    graph.set_conditional_entry_point(
+        RunnableLambda(input_router_edge, afunc=ainput_router_edge),
+        {
+            "generate_kg": "generate_kg",
+            "investigate_kg": "investigate_kg",
+            "direct_llm": "direct_llm",
+        },
+    )
+    graph.add_conditional_edges(
+        "generate_kg",
+        tool_router_edge,
+        {"call_tool": "explore_kg_tool", "__end__": END},
+    )
+    graph.add_conditional_edges(
+        "investigate_kg",
+        tool_router_edge,
+        {"call_tool": "explore_kg_tool", "__end__": END},
+    )
+    graph.add_conditional_edges(
+        "explore_kg_tool",
+        lambda state: state["sender"],
+        {"generate_kg": "generate_kg", "investigate_kg": "investigate_kg"},
+    )
+    graph.add_edge("direct_llm", END)
+
+    return graph.compile()
 
 
 class LlmAgent:
     def __init__(
         self,
-        ontology: Ontology = Ontology(labels=[], relationships=[]),
-        kg: Graph = Graph(edges=[]),
+        ontology: Ontology | None = None,
+        kg: Graph | None = None,
     ) -> None:
-        self._ontology = ontology
-        self._kg = kg
-        self.graph = self._compile()
-
-    def _compile(self) -> CompiledGraph:
-        graph = StateGraph(AgentState)
-
-        # nodes
-        graph.add_node("generate_kg", generate_kg_node)
-        graph.add_node("investigate_kg", investigate_kg_node)
-        graph.add_node("direct_llm", direct_llm_node)
-        graph.add_node("explore_kg_tool", explore_kg_tool_node)
-
-        # edges
-        graph.set_conditional_entry_point(
-            input_router_edge,
+        self._ontology = ontology or Ontology(labels=[], relationships=[])
+        # the agent is the single writer of its graph, chunks are processed on
+        # snapshots of it
+        self._kg = kg if kg is not None else Graph(edges=[])
+        self.graph = compile_agent_graph()
+
+    def _invoke(self, query: str, route: Route | None = None) -> AgentState:
+        return self.graph.invoke(
             {
-                "generate_kg": "generate_kg",
-                "investigate_kg": "investigate_kg",
-                "direct_llm": "direct_llm",
+                "query": query,
+                "ontology": self._ontology,
+                "kg": self._kg.snapshot(),
+                "explorations": [],
+                "tool_results": {},
+                "route": route,
             },
+            config={"recursion_limit": config.AGENT_STEPS_LIMIT},
         )
-        graph.add_conditional_edges(
-            "generate_kg",
-            tool_router_edge,
-            {"call_tool": "explore_kg_tool", "__end__": END},
+
+    async def _ainvoke(
+        self,
+        query: str,
+        route: Route | None = None,
+        on_edges: Callable[[list[Edge]], None] | None = None,
+    ) -> AgentState:
+        return await self.graph.ainvoke(
+            {
+                "query": query,
+                "ontology": self._ontology,
+                "kg": self._kg.snapshot(),
+                "explorations": [],
+                "tool_results": {},
+                "route": route,
+            },
+            config={
+                "recursion_limit": config.AGENT_STEPS_LIMIT,
+                "configurable": {"on_edges": on_edges},
+            },
         )
-        graph.add_conditional_edges(
-            "investigate_kg",
-            tool_router_edge,
-            {"call_tool": "explore_kg_tool", "__end__": END},
+
+    def _chunk_budget(self) -> int:
+        """Tokens of the next chunk: the context window left by the KG generation
+        prompt for the current ontology and graph, its explorations and the
+        completion, up to the size whose edges fit in the completion, unless
+        chunks have a fixed size"""
+        if config.CHUNK_TOKENS_LIMIT:
+            return config.CHUNK_TOKENS_LIMIT
+
+        names = self._kg.edges.dictionaries["names"]
+        nodes = list(names[: config.PROMPT_NODES_LIMIT])
+        if len(names) > len(nodes):
+            nodes.append(f"... and {len(names) - len(nodes)} other entities")
+        prompt = GENERATE_KG_SYSTEM_PROMPT.format(
+            ontology=str(self._ontology.dump()), nodes=nodes, explorations=[]
         )
-        graph.add_conditional_edges(
-            "explore_kg_tool",
-            lambda state: state["sender"],
-            {"generate_kg": "generate_kg", "investigate_kg": "investigate_kg"},
+        budget = (
+            config.LLM_CONTEXT_TOKENS
+            - config.LLM_COMPLETION_TOKENS_RESERVE
+            - config.PROMPT_EXPLORATIONS_TOKENS_RESERVE
+            - get_tokenizer().count(prompt)
         )
-        graph.add_edge("direct_llm", END)
+        # past this size, the completion would be cut before the last edges
+        limit = int(
+            config.LLM_COMPLETION_TOKENS_RESERVE / config.CHUNK_COMPLETION_RATIO
+        )
+        return max(min(budget, limit), config.CHUNK_TOKENS_MIN)
+
+    def _chunks(self, query: str | Iterable[str]) -> Iterator[str]:
+        # chunks are cut as they are processed, each sized on the graph as
+        # merged so far
+        pieces = [query] if isinstance(query, str) else query
+        return chunk_text(pieces, self._chunk_budget, get_tokenizer())
+
+    def _start(
+        self, query: str | Iterable[str], resume: bool
+    ) -> tuple[list[str], Iterator[str], RunCheckpoint | None]:
+        """The first chunks of the query, to route it, all its chunks and the
+        checkpoint of the run"""
+        chunks = self._chunks(query)
+        head = list(itertools.islice(chunks, 2))
+        if not head:
+            raise ValueError("The query is empty")
+        # with resume, the chunks of a previous run of the same input are replayed
+        # from their checkpoints instead of being processed again, if their text
+        # is the same
+        checkpoint = get_run_checkpoint(query, self._ontology, resume)
+        return head, itertools.chain(head, chunks), checkpoint
+
+    def _preroute(self, query: str | Iterable[str], head: list[str]) -> Route | None:
+        # the end of an input given in pieces is not read ahead to tell whether
+        # it is a question, so one of several chunks is taken as a document
+        if not isinstance(query, str):
+            return "generate_kg" if len(head) > 1 else None
+        return preroute_query(query, len(head))
+
+    def _route(self, query: str | Iterable[str], head: list[str]) -> Route | None:
+        if config.ROUTER_MODE != "document":
+            return None
+
+        route = self._preroute(query, head)
+        if route is None:
+            with record_step("router"):
+                route = route_query(head[0])
+        logger.info(f"Routing document to {route}")
+        return route
+
+    async def _aroute(
+        self, query: str | Iterable[str], head: list[str]
+    ) -> Route | None:
+        if config.ROUTER_MODE != "document":
+            return None
+
+        route = self._preroute(query, head)
+        if route is None:
+            with record_step("router"):
+                route = await aroute_query(head[0])
+        logger.info(f"Routing document to {route}")
+        return route
+
+    def _merge(self, state: AgentState) -> AgentState:
+        metrics = state.get("chunk_metrics")
+        if metrics is not None:
+            metrics.nodes_before = self._kg.get_nodes_count()
+            metrics.edges_before = len(self._kg.edges)
+
+        if state.get("kg_delta") is not None:
+            self._kg.merge_edges(state["kg_delta"])
+        state["kg"] = self._kg
+
+        if metrics is not None:
+            metrics.nodes_after = self._kg.get_nodes_count()
+            metrics.edges_after = len(self._kg.edges)
+        return state
 
-        return graph.compile()
+    def _process(
+        self,
+        i: int,
+        query: str,
+        route: Route | None,
+        checkpoint: RunCheckpoint | None,
+    ) -> AgentState:
+        with record_chunk(i) as metrics:
+            state = checkpoint.get(i, query) if checkpoint is not None else None
+            if state is not None:
+                logger.info(f"Query {i+1} restored from checkpoint")
+                metrics.restored = True
+            else:
+                state = self._invoke(query, route)
+                if checkpoint is not None:
+                    checkpoint.save(i, query, state)
+
+        state["chunk_metrics"] = metrics
+        return state
 
-    def run(self, query: str) -> AgentState:
-        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            model_name=config.OPENAI_CHAT_MODEL,
-            chunk_size=config.CHUNK_TOKENS_LIMIT,
-            chunk_overlap=0,
-        )
-        queries = text_splitter.split_text(query)
-
-        for i, q in enumerate(queries):
-            logger.info(f"Agent execution for query {i+1}/{len(queries)}")
-            state = self.graph.invoke(
-                {
-                    "query": q,
-                    "ontology": self._ontology,
-                    "kg": self._kg,
-                    "explorations": [],
-                },
-                config={"recursion_limit": config.AGENT_STEPS_LIMIT},
+    async def _aprocess(
+        self,
+        i: int,
+        query: str,
+        route: Route | None,
+        checkpoint: RunCheckpoint | None,
+        on_edges: Callable[[list[Edge]], None] | None = None,
+    ) -> AgentState:
+        with record_chunk(i) as metrics:
+            state = checkpoint.get(i, query) if checkpoint is not None else None
+            if state is not None:
+                logger.info(f"Query {i+1} restored from checkpoint")
+                metrics.restored = True
+            else:
+                state = await self._ainvoke(query, route, on_edges)
+                if checkpoint is not None:
+                    checkpoint.save(i, query, state)
+
+        state["chunk_metrics"] = metrics
+        return state
+
+    def run(
+        self,
+        query: str | Iterable[str],
+        max_workers: int = config.AGENT_MAX_WORKERS,
+        resume: bool = False,
+        route: Route | None = None,
+    ) -> AgentState:
+        """Run the agent on a query, given as a string or as the consecutive pieces
+        of a text (e.g. read_text of a file), which is split into chunks lazily"""
+        head, queries, checkpoint = self._start(query, resume)
+        start, metrics = time.perf_counter(), RunMetrics()
+        with record_run(metrics):
+            route = route or self._route(query, head)
+
+        if max_workers > 1 and len(head) > 1:
+            states = self._run_concurrent(queries, max_workers, route, checkpoint)
+        else:
+            states = (
+                self._merge(self._process(i, q, route, checkpoint))
+                for i, q in enumerate(queries)
             )
+
+        # only the metrics of the chunks are kept, not their states
+        chunks_metrics = []
+        for i, state in enumerate(states):
+            logger.info(f"Agent execution for query {i+1} done")
+            chunks_metrics.append(state["chunk_metrics"])
+
+        state["chunks"] = len(chunks_metrics)
+        metrics.seconds = time.perf_counter() - start
+        metrics.chunks = chunks_metrics
+        state["metrics"] = metrics
         return state
+
+    def _run_concurrent(
+        self,
+        queries: Iterator[str],
+        max_workers: int,
+        route: Route | None,
+        checkpoint: RunCheckpoint | None,
+    ) -> Iterator[AgentState]:
+        # every chunk is extracted against a snapshot of the graph as merged when
+        # it starts, and the resulting deltas are merged back in chunk order as
+        # they complete. Up to `max_workers` chunks are queued beyond the ones
+        # being extracted, so that the input is only read as far as needed.
+        logger.info(f"Agent execution with {max_workers} workers")
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for i, q in enumerate(queries):
+                if len(pending) >= 2 * max_workers:
+                    yield self._merge(pending.popleft().result())
+                pending.append(executor.submit(self._process, i, q, route, checkpoint))
+            while pending:
+                yield self._merge(pending.popleft().result())
+
+    async def astream(
+        self,
+        query: str | Iterable[str],
+        max_workers: int = config.AGENT_MAX_WORKERS,
+        resume: bool = False,
+        route: Route | None = None,
+    ) -> AsyncIterator[AgentEvent]:
+        """Run the agent on the event loop, yielding an event when the run starts,
+        "edges" events with the edges extracted from a chunk as they are generated,
+        one per chunk with the edges it added to the graph once merged, and one
+        with the final state. Up to `max_workers` chunks are processed
+        concurrently."""
+        head, queries, checkpoint = self._start(query, resume)
+        start, metrics = time.perf_counter(), RunMetrics()
+        with record_run(metrics):
+            route = route or await self._aroute(query, head)
+        yield AgentEvent(event="start", route=route)
+
+        events: asyncio.Queue[AgentEvent | None] = asyncio.Queue()
+        semaphore = asyncio.Semaphore(max(max_workers, 1))
+        pending: deque[asyncio.Future] = deque()
+
+        def on_edges(i: int) -> Callable[[list[Edge]], None]:
+            return lambda edges: events.put_nowait(
+                AgentEvent(event="edges", chunk=i, edges=edges)
+            )
+
+        async def process(i: int, q: str) -> AgentState:
+            async with semaphore:
+                logger.info(f"Agent execution for query {i+1}")
+                return await self._aprocess(i, q, route, checkpoint, on_edges(i))
+
+        async def merge_next(i: int) -> AgentState:
+            state = await pending.popleft()
+            n_edges = len(self._kg.edges)
+            state = self._merge(state)
+            events.put_nowait(
+                AgentEvent(
+                    event="chunk",
+                    chunk=i,
+                    edges=self._kg.edges[n_edges:],
+                    generation=state.get("generation"),
+                )
+            )
+            return state
+
+        async def produce() -> None:
+            # sequentially, each chunk is cut once the previous one is merged.
+            # Concurrently, as in run, chunks are extracted against snapshots of
+            # the graph and merged back in chunk order.
+            window = 2 * max_workers if max_workers > 1 and len(head) > 1 else 1
+
+            chunks_metrics = []
+            try:
+                for i, q in enumerate(queries):
+                    pending.append(asyncio.ensure_future(process(i, q)))
+                    if len(pending) >= window:
+                        state = await merge_next(len(chunks_metrics))
+                        chunks_metrics.append(state["chunk_metrics"])
+                while pending:
+                    state = await merge_next(len(chunks_metrics))
+                    chunks_metrics.append(state["chunk_metrics"])
+
+                state["chunks"] = len(chunks_metrics)
+                metrics.seconds = time.perf_counter() - start
+                metrics.chunks = chunks_metrics
+                state["metrics"] = metrics
+                events.put_nowait(AgentEvent(event="end", state=state))
+            finally:
+                events.put_nowait(None)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            await producer
+        finally:
+            for task in [producer, *pending]:
+                task.cancel()
+
+    async def arun(
+        self,
+        query: str | Iterable[str],
+        max_workers: int = config.AGENT_MAX_WORKERS,
+        resume: bool = False,
+        route: Route | None = None,
+    ) -> AgentState:
+        async for event in self.astream(query, max_workers, resume, route):
+            if event["event"] == "end":
+                return event["state"]
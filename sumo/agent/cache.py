@@ -0,0 +1,172 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+from sumo.agent.metrics import current_llm_call
+from sumo.settings import config
+
+
+class SqliteLlmCache(BaseCache):
+    """On-disk LLM response cache, keyed on the hash of the rendered prompt and
+    of the model configuration (model, temperature, bound tools).
+
+    Entries expire after `ttl_seconds` and the least recently used ones are
+    evicted once the stored responses exceed `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = config.LLM_CACHE_MAX_BYTES,
+        ttl_seconds: float | None = config.LLM_CACHE_TTL_SECONDS,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS llm_cache_accessed_at "
+            "ON llm_cache (accessed_at)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS llm_cache_created_at ON llm_cache (created_at)"
+        )
+        # total size of the responses, kept by triggers so that it is not summed
+        # on every write, and counted once for the caches created without it
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS llm_cache_size (
+                id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL
+            );
+            CREATE TRIGGER IF NOT EXISTS llm_cache_inserted AFTER INSERT ON llm_cache
+            BEGIN UPDATE llm_cache_size SET total = total + new.size; END;
+            CREATE TRIGGER IF NOT EXISTS llm_cache_deleted AFTER DELETE ON llm_cache
+            BEGIN UPDATE llm_cache_size SET total = total - old.size; END;
+            CREATE TRIGGER IF NOT EXISTS llm_cache_updated
+            AFTER UPDATE OF size ON llm_cache
+            BEGIN UPDATE llm_cache_size SET total = total + new.size - old.size; END;
+            INSERT OR IGNORE INTO llm_cache_size
+            SELECT 0, COALESCE(SUM(size), 0) FROM llm_cache;
+            """)
+        self._conn.commit()
+
+    def __repr__(self) -> str:
+        # the models serialize the cache they are given into the keys of their
+        # responses: a repr with the address of the object would change the keys
+        # in every process
+        return f"{type(self).__name__}()"
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode()).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and self.ttl_seconds and row[1] < now - self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            call = current_llm_call()
+            if call is not None:
+                call.cache_hit = True
+            self._conn.execute(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        return loads(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._key(prompt, llm_string)
+        value = dumps(list(return_val))
+        now = time.time()
+        with self._lock:
+            # upserted rather than replaced, as replacing does not fire the delete
+            # trigger
+            self._conn.execute(
+                "INSERT INTO llm_cache VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO "
+                "UPDATE SET value = excluded.value, size = excluded.size, "
+                "created_at = excluded.created_at, accessed_at = excluded.accessed_at",
+                (key, value, len(value), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.ttl_seconds:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+
+        total = self._size()
+        if total <= self.max_bytes:
+            return
+
+        # least recently used first, read only as far as needed
+        rows = self._conn.execute(
+            "SELECT key, size FROM llm_cache ORDER BY accessed_at"
+        )
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        rows.close()
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", evicted)
+
+    def _size(self) -> int:
+        return self._conn.execute("SELECT total FROM llm_cache_size").fetchone()[0]
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            size = self._size()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+@lru_cache(maxsize=None)
+def _open_llm_cache(path: str) -> SqliteLlmCache:
+    return SqliteLlmCache(path)
+
+
+def get_llm_cache() -> SqliteLlmCache | None:
+    if not config.LLM_CACHE_PATH:
+        return None
+    return _open_llm_cache(config.LLM_CACHE_PATH)
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Iterable
+
+from sumo.schemas import Graph, Ontology
+from sumo.settings import config
+
+logger = logging.getLogger("llm")
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class CheckpointStore:
+    """SQLite store of the results of each chunk processed by agent runs, keyed on
+    a hash of the run input"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "run_id TEXT NOT NULL, chunk INTEGER NOT NULL, chunk_hash TEXT NOT NULL, "
+            "generation TEXT, kg_delta TEXT, PRIMARY KEY (run_id, chunk))"
+        )
+        self._conn.commit()
+
+    def load(self, run_id: str) -> dict[int, tuple[str, dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk, chunk_hash, generation, kg_delta FROM checkpoints "
+                "WHERE run_id = ?",
+                (run_id,),
+            ).fetchall()
+
+        checkpoints = {}
+        for chunk, chunk_hash, generation, kg_delta in rows:
+            state = {"generation": generation}
+            if kg_delta is not None:
+                state["kg_delta"] = Graph.model_validate_json(kg_delta)
+            checkpoints[chunk] = (chunk_hash, state)
+        return checkpoints
+
+    def save(self, run_id: str, chunk: int, chunk_hash: str, state: dict) -> None:
+        kg_delta = state.get("kg_delta")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    chunk,
+                    chunk_hash,
+                    state.get("generation"),
+                    kg_delta.model_dump_json() if kg_delta is not None else None,
+                ),
+            )
+            self._conn.commit()
+
+    def clear(self, run_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+            self._conn.commit()
+
+
+class RunCheckpoint:
+    """Checkpoints of the chunks of a single run"""
+
+    def __init__(self, store: CheckpointStore, run_id: str, resume: bool) -> None:
+        self._store = store
+        self._run_id = run_id
+        if resume:
+            self._done = store.load(run_id)
+            logger.info(f"Resuming run {run_id[:12]}, {len(self._done)} chunks done")
+        else:
+            self._done = {}
+            store.clear(run_id)
+
+    def get(self, chunk: int, query: str) -> dict | None:
+        chunk_hash, state = self._done.get(chunk, (None, None))
+        if chunk_hash != _hash(query):
+            return None
+        return dict(state)
+
+    def save(self, chunk: int, query: str, state: dict) -> None:
+        self._store.save(self._run_id, chunk, _hash(query), state)
+
+
+@lru_cache(maxsize=None)
+def _open_checkpoint_store(path: str) -> CheckpointStore:
+    return CheckpointStore(path)
+
+
+def get_run_checkpoint(
+    query: str | Iterable[str], ontology: Ontology, resume: bool
+) -> RunCheckpoint | None:
+    """Checkpoint of a run, identified by its whole input, given as a string or as
+    its pieces. The pieces must be readable more than once (e.g. read_text), as
+    they are read here to hash them."""
+    if not config.CHECKPOINT_PATH:
+        return None
+
+    pieces = [query] if isinstance(query, str) else query
+    if iter(pieces) is pieces:
+        logger.warning("Checkpoints are disabled for an input that is read only once")
+        return None
+    input_hash = hashlib.sha256()
+    for piece in pieces:
+        input_hash.update(piece.encode())
+
+    run_id = _hash(
+        json.dumps(
+            [
+                input_hash.hexdigest(),
+                ontology.dump(),
+                config.OPENAI_CHAT_MODEL,
+                config.CHUNK_TOKENS_LIMIT,
+            ]
+        )
+    )
+    return RunCheckpoint(_open_checkpoint_store(config.CHECKPOINT_PATH), run_id, resume)
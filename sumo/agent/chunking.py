@@ -0,0 +1,111 @@
+import logging
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator
+
+from sumo.settings import config
+
+logger = logging.getLogger("llm")
+
+# chunks are cut after the last of these separators within their budget, if it
+# is in the second half of the chunk
+_SEPARATORS = ["\n\n", "\n", ". ", " "]
+# upper bound of the characters of a token, to read only as much input as needed
+_MAX_CHARS_PER_TOKEN = 8
+_READ_SIZE = 64 * 1024
+
+
+class Tokenizer:
+    """Tokenizer of a chat model. Without its encoding (e.g. offline), tokens are
+    estimated at 4 characters each."""
+
+    def __init__(self, model: str) -> None:
+        try:
+            import tiktoken
+
+            self._encoding = tiktoken.encoding_for_model(model)
+        except Exception as e:
+            logger.warning(
+                f"Tokenizer of {model} not available ({e!r}), "
+                "estimating 4 characters per token"
+            )
+            self._encoding = None
+
+    def _encode(self, text: str) -> list[int]:
+        return self._encoding.encode(text, disallowed_special=())
+
+    def count(self, text: str) -> int:
+        if self._encoding is None:
+            return -(-len(text) // 4)
+        return len(self._encode(text))
+
+    def offset(self, text: str, tokens: int) -> int | None:
+        """Characters of the first `tokens` tokens of the text, or None if the text
+        is not longer than that"""
+        if self._encoding is None:
+            return 4 * tokens if len(text) > 4 * tokens else None
+
+        ids = self._encode(text)
+        if len(ids) <= tokens:
+            return None
+        _, offsets = self._encoding.decode_with_offsets(ids[: tokens + 1])
+        return offsets[tokens]
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model: str = config.OPENAI_CHAT_MODEL) -> Tokenizer:
+    return Tokenizer(model)
+
+
+class TextFile:
+    """The text of a file, read in pieces of `size` characters each time it is
+    iterated, so that it can be read more than once (e.g. to hash it)"""
+
+    def __init__(self, path: str, size: int = _READ_SIZE) -> None:
+        self.path = path
+        self.size = size
+
+    def __iter__(self) -> Iterator[str]:
+        with open(self.path, encoding="utf-8") as f:
+            while piece := f.read(self.size):
+                yield piece
+
+
+def read_text(path: str, size: int = _READ_SIZE) -> TextFile:
+    return TextFile(path, size)
+
+
+def _cut(text: str, end: int) -> int:
+    for separator in _SEPARATORS:
+        position = text.rfind(separator, end // 2, end)
+        if position != -1:
+            return position + len(separator)
+    return end
+
+
+def chunk_text(
+    pieces: Iterable[str], budget: Callable[[], int], tokenizer: Tokenizer
+) -> Iterator[str]:
+    """Split a text, given as its consecutive pieces, into chunks of at most
+    `budget()` tokens. The input is read lazily, only as far as the next chunk,
+    and the budget is asked again for each chunk."""
+    pieces = iter(pieces)
+    buffer, exhausted = "", False
+    while buffer or not exhausted:
+        tokens = budget()
+        window = tokens * _MAX_CHARS_PER_TOKEN
+        while not exhausted and len(buffer) < window:
+            piece = next(pieces, None)
+            if piece is None:
+                exhausted = True
+            else:
+                buffer += piece
+
+        end = tokenizer.offset(buffer[:window], tokens)
+        if end is None and exhausted and len(buffer) <= window:
+            cut = len(buffer)
+        else:
+            cut = _cut(buffer, end or window)
+
+        chunk, buffer = buffer[:cut].strip(), buffer[cut:]
+        if chunk:
+            yield chunk
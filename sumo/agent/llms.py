@@ -1,6 +1,13 @@
-from typing import Literal
+import asyncio
+import logging
+import weakref
+from functools import lru_cache, wraps
+from typing import Any, AsyncIterator, Callable, Iterator, Literal, Optional, Type
 
+import httpx
+from langchain_core.caches import BaseCache
 from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers import (
     BaseGenerationOutputParser,
     PydanticOutputParser,
@@ -8,55 +15,230 @@ from langchain_core.output_parsers import (
 )
 from langchain_core.outputs import ChatGeneration
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableSerializable
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import (
+    Runnable,
+    RunnableConfig,
+    RunnableSequence,
+    RunnableSerializable,
+)
 from pydantic import BaseModel
 
+from sumo.agent.cache import get_llm_cache
+from sumo.agent.parsing import EdgeStreamParser
 from sumo.agent.prompts import (
     DIRECT_LLM_SYSTEM_PROMPT,
     GENERATE_KG_SYSTEM_PROMPT,
     INVESTIGATE_KG_SYSTEM_PROMPT,
     ROUTER_SYSTEM_PROMPT,
 )
-from sumo.agent.tools import get_explore_kg_tool
+from sumo.agent.ratelimit import (
+    BULK,
+    INTERACTIVE,
+    ScheduledRunnable,
+    get_rate_limiter,
+)
+from sumo.agent.tools import get_explore_kg_tool, get_kg_tools
 from sumo.schemas import Graph
 from sumo.settings import config
 
+logger = logging.getLogger("llm")
+
+
+class _LoopTransport(httpx.AsyncBaseTransport):
+    """Asynchronous transport with a connection pool per event loop, so that a
+    client shared by the whole process can be used by successive `asyncio.run`"""
+
+    def __init__(self, **kwargs) -> None:
+        self._kwargs = kwargs
+        # the pool of a loop is dropped with the loop
+        self._transports = weakref.WeakKeyDictionary()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        if (transport := self._transports.get(loop)) is None:
+            transport = self._transports[loop] = httpx.AsyncHTTPTransport(
+                **self._kwargs
+            )
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        if transport := self._transports.pop(asyncio.get_running_loop(), None):
+            await transport.aclose()
+
+
+@lru_cache(maxsize=None)
+def _get_llm(model: str, temperature: float, cache: BaseCache | None) -> BaseChatModel:
+    # the OpenAI client is only imported when the first chain is built
+    from langchain_openai import ChatOpenAI
+    from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+
+    # retries are left to the rate limiter, which also follows the rate-limit
+    # headers of every response
+    limiter = get_rate_limiter()
+    llm = ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        api_key=config.OPENAI_API_KEY,
+        cache=cache,
+        max_retries=0,
+        http_client=DefaultHttpxClient(event_hooks={"response": [limiter.observe]}),
+        http_async_client=DefaultAsyncHttpxClient(
+            transport=_LoopTransport(), event_hooks={"response": [limiter.aobserve]}
+        ),
+    )
+    # the HTTP clients are only needed to build the OpenAI clients: as arguments
+    # of the model they would be serialized, with their address, in the key of
+    # the LLM cache, which would then change in every process
+    llm.http_client = llm.http_async_client = None
+    return llm
+
 
 def get_llm(
     model: str = config.OPENAI_CHAT_MODEL,
     temperature: float = config.LLM_DEFAULT_TEMPERATURE,
 ) -> BaseChatModel:
-    return ChatOpenAI(
-        model=model, temperature=temperature, api_key=config.OPENAI_API_KEY
-    )
+    # a single client per configuration, so that its HTTP connection pool is
+    # reused across calls
+    return _get_llm(model, temperature, get_llm_cache())
+
+
+def cached_chain(build: Callable[..., RunnableSerializable]) -> Callable:
+    """Build a chain once per set of arguments (and LLM cache in use) and reuse it
+    for all the following calls"""
+    chains = lru_cache(maxsize=None)(lambda cache, *args: build(*args))
+
+    @wraps(build)
+    def get_chain(*args) -> RunnableSerializable:
+        return chains(get_llm_cache(), *args)
+
+    get_chain.cache_clear = chains.cache_clear
+    return get_chain
+
+
+def schedule(llm: Runnable, priority: int) -> Runnable:
+    return ScheduledRunnable(llm, get_rate_limiter(), priority)
+
+
+def bind_explore_kg_tool(llm: BaseChatModel) -> RunnableSerializable:
+    # the bound tool only describes its arguments to the LLM, the calls are run
+    # against the actual graph by the explore_kg_tool node
+    return llm.bind_tools([get_explore_kg_tool(Graph(edges=[]))])
+
+
+def bind_kg_tools(llm: BaseChatModel) -> RunnableSerializable:
+    # all the graph queries, to answer questions on the structure of the graph
+    return llm.bind_tools(get_kg_tools(Graph(edges=[])))
 
 
 class CustomOutput(BaseModel):
-    type: Literal["str", "pydantic", "tool"]
+    type: Literal["str", "pydantic", "tool", "partial"]
     tool_calls: list[dict] = None
     pydantic_object: BaseModel = None
     str_generation: str = None
 
 
 class CustomOutputParser(BaseGenerationOutputParser):
-    def __init__(self, pydantic_object: BaseModel | None = None) -> None:
-        self.pydantic_object = pydantic_object
+    pydantic_object: Optional[Type[BaseModel]] = None
+
+    def __init__(self, pydantic_object: Type[BaseModel] | None = None) -> None:
+        super().__init__(pydantic_object=pydantic_object)
 
     def parse_result(self, result: list[ChatGeneration]) -> CustomOutput:
         if "tool_calls" in result[0].message.additional_kwargs:
             return CustomOutput(type="tool", tool_calls=result[0].message.tool_calls)
         elif self.pydantic_object:
             return CustomOutput(
-                type="pydantic",
-                pydantic_object=PydanticOutputParser(self.pydantic_object).parse_result(
-                    result
-                ),
+                type="pydantic", pydantic_object=self.parse_pydantic(result)
             )
         return CustomOutput(
             type="str", str_generation=StrOutputParser().parse_result(result)
         )
 
+    def parse_pydantic(self, result: list[ChatGeneration]) -> BaseModel:
+        return PydanticOutputParser(pydantic_object=self.pydantic_object).parse_result(
+            result
+        )
+
+
+class GraphOutputParser(CustomOutputParser):
+    """Parses a generated graph edge by edge, skipping the invalid edges. When
+    streamed, the edges are also yielded in "partial" outputs as they are
+    generated, before the final output."""
+
+    def __init__(self) -> None:
+        super().__init__(Graph)
+
+    def parse_pydantic(self, result: list[ChatGeneration]) -> Graph:
+        parser = EdgeStreamParser()
+        parser.feed(result[0].text)
+        self._check_length(result[0].message, parser)
+        return Graph(edges=parser.edges)
+
+    @staticmethod
+    def _check_length(message: BaseMessage, parser: EdgeStreamParser) -> None:
+        # the edges after the cut of a truncated completion are lost
+        if message.response_metadata.get("finish_reason") == "length":
+            logger.warning(
+                f"Graph generation cut at the completion limit after "
+                f"{len(parser.edges)} edges, the following edges are lost: lower "
+                f"CHUNK_TOKENS_LIMIT or raise CHUNK_COMPLETION_RATIO"
+            )
+
+    def _partial(self, parser: EdgeStreamParser, chunk: BaseMessage) -> list:
+        if not isinstance(chunk.content, str):
+            return []
+        edges = parser.feed(chunk.content)
+        if not edges:
+            return []
+        return [CustomOutput(type="partial", pydantic_object=Graph(edges=edges))]
+
+    def _final(self, parser: EdgeStreamParser, message: BaseMessage) -> CustomOutput:
+        if "tool_calls" in message.additional_kwargs:
+            return CustomOutput(type="tool", tool_calls=message.tool_calls)
+        self._check_length(message, parser)
+        return CustomOutput(type="pydantic", pydantic_object=Graph(edges=parser.edges))
+
+    def _transform(self, input: Iterator[BaseMessage]) -> Iterator[CustomOutput]:
+        parser = EdgeStreamParser()
+        message = None
+        for chunk in input:
+            message = chunk if message is None else message + chunk
+            yield from self._partial(parser, chunk)
+        yield self._final(parser, message)
+
+    async def _atransform(
+        self, input: AsyncIterator[BaseMessage]
+    ) -> AsyncIterator[CustomOutput]:
+        parser = EdgeStreamParser()
+        message = None
+        async for chunk in input:
+            message = chunk if message is None else message + chunk
+            for output in self._partial(parser, chunk):
+                yield output
+        yield self._final(parser, message)
+
+    def transform(
+        self,
+        input: Iterator[BaseMessage],
+        config: RunnableConfig | None = None,
+        **kwargs: Any,
+    ) -> Iterator[CustomOutput]:
+        yield from self._transform_stream_with_config(input, self._transform, config)
+
+    async def atransform(
+        self,
+        input: AsyncIterator[BaseMessage],
+        config: RunnableConfig | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[CustomOutput]:
+        async for output in self._atransform_stream_with_config(
+            input, self._atransform, config
+        ):
+            yield output
+
 
 # Router
 class RouteQuery(BaseModel):
@@ -65,20 +247,28 @@ class RouteQuery(BaseModel):
     source: Literal["generate_kg", "investigate_kg", "direct_llm"]
 
 
+@cached_chain
 def router_llm() -> RunnableSerializable:
     llm = get_llm()
-    structured_llm_router = llm.with_structured_output(RouteQuery)
+    # the model is scheduled apart from the parsers of its structured output, so
+    # that the usage of its response is recorded
+    model, *parsers = llm.with_structured_output(RouteQuery).steps
     prompt = ChatPromptTemplate.from_messages(
         [
             ("system", ROUTER_SYSTEM_PROMPT),
             ("human", "{query}"),
         ]
     )
-    return prompt | structured_llm_router
+    return RunnableSequence(prompt, schedule(model, INTERACTIVE), *parsers)
 
 
 # Generate KG
 def generate_kg_llm(kg: Graph) -> RunnableSerializable:
+    return _generate_kg_llm(bool(kg.edges))
+
+
+@cached_chain
+def _generate_kg_llm(with_tools: bool) -> RunnableSerializable:
     llm = get_llm()
     prompt = ChatPromptTemplate.from_messages(
         [
@@ -86,12 +276,17 @@ def generate_kg_llm(kg: Graph) -> RunnableSerializable:
             ("human", "{query}"),
         ]
     )
-    llm_with_tools = llm.bind_tools([get_explore_kg_tool(kg)]) if kg.edges else llm
-    return prompt | llm_with_tools | CustomOutputParser(Graph)
+    llm_with_tools = bind_explore_kg_tool(llm) if with_tools else llm
+    return prompt | schedule(llm_with_tools, BULK) | GraphOutputParser()
 
 
 # Investigate KG
 def investigate_kg_llm(kg: Graph) -> RunnableSerializable:
+    return _investigate_kg_llm(bool(kg.edges))
+
+
+@cached_chain
+def _investigate_kg_llm(with_tools: bool) -> RunnableSerializable:
     llm = get_llm()
     prompt = ChatPromptTemplate.from_messages(
         [
@@ -99,11 +294,12 @@ def investigate_kg_llm(kg: Graph) -> RunnableSerializable:
             ("human", "{query}"),
         ]
     )
-    llm_with_tools = llm.bind_tools([get_explore_kg_tool(kg)]) if kg.edges else llm
-    return prompt | llm_with_tools | CustomOutputParser()
+    llm_with_tools = bind_kg_tools(llm) if with_tools else llm
+    return prompt | schedule(llm_with_tools, INTERACTIVE) | CustomOutputParser()
 
 
 # Direct LLM
+@cached_chain
 def direct_llm() -> RunnableSerializable:
     llm = get_llm()
     prompt = ChatPromptTemplate.from_messages(
@@ -112,4 +308,4 @@ def direct_llm() -> RunnableSerializable:
             ("human", "{query}"),
         ]
     )
-    return prompt | llm | StrOutputParser()
+    return prompt | schedule(llm, INTERACTIVE) | StrOutputParser()
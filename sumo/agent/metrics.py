@@ -0,0 +1,244 @@
+import contextvars
+import functools
+import inspect
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from pydantic import BaseModel, Field
+
+from sumo.settings import config
+
+# metrics of the chunk being processed (or of the run, for the steps run once for
+# the whole run) and of the step being run, set while an agent processes a chunk
+# and recorded into by its steps and LLM calls
+_chunk: contextvars.ContextVar["ChunkMetrics | RunMetrics | None"] = (
+    contextvars.ContextVar("chunk_metrics", default=None)
+)
+_step: contextvars.ContextVar["StepMetrics | None"] = contextvars.ContextVar(
+    "step_metrics", default=None
+)
+_llm_call: contextvars.ContextVar["LlmCall | None"] = contextvars.ContextVar(
+    "llm_call", default=None
+)
+
+
+class LlmCall:
+    """An LLM call in progress, noted by the HTTP clients and the LLM cache"""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.cache_hit = False
+
+
+def start_llm_call() -> LlmCall:
+    call = LlmCall()
+    _llm_call.set(call)
+    return call
+
+
+def current_llm_call() -> LlmCall | None:
+    return _llm_call.get()
+
+
+class StepMetrics(BaseModel):
+    """Metrics of a single run of a graph node or tool call"""
+
+    step: str
+    seconds: float = 0.0
+    llm_calls: int = 0
+    # estimated from the length of the rendered prompts
+    prompt_size_tokens: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cache_hits: int = 0
+    retries: int = 0
+
+
+class ChunkMetrics(BaseModel):
+    """Metrics of the processing of a chunk and of the merge of its results"""
+
+    chunk: int
+    seconds: float = 0.0
+    restored: bool = False
+    steps: list[StepMetrics] = Field(default_factory=list)
+    nodes_before: int = 0
+    nodes_after: int = 0
+    edges_before: int = 0
+    edges_after: int = 0
+
+    def add(self, step: StepMetrics) -> None:
+        # steps of concurrent calls are appended from their threads, which the
+        # atomic append of lists makes safe without a lock
+        self.steps.append(step)
+
+
+class RunMetrics(BaseModel):
+    """Metrics of an agent run, with their totals by step"""
+
+    seconds: float = 0.0
+    # steps run once for the whole run, as the routing of a document
+    steps: list[StepMetrics] = Field(default_factory=list)
+    chunks: list[ChunkMetrics] = Field(default_factory=list)
+
+    def add(self, step: StepMetrics) -> None:
+        self.steps.append(step)
+
+    def totals(self) -> dict[str, dict[str, float]]:
+        totals = {}
+        steps = [*self.steps, *(step for chunk in self.chunks for step in chunk.steps)]
+        for step in steps:
+            total = totals.setdefault(step.step, {"count": 0})
+            total["count"] += 1
+            for name, value in step.model_dump(exclude={"step"}).items():
+                total[name] = total.get(name, 0) + value
+        return totals
+
+    def cost(self) -> float:
+        """Cost in dollars of the tokens used, as per the configured prices"""
+        totals = self.totals().values()
+        prompt_tokens = sum(total["prompt_tokens"] for total in totals)
+        completion_tokens = sum(total["completion_tokens"] for total in totals)
+        return (
+            prompt_tokens * config.LLM_PROMPT_COST_PER_1K_TOKENS
+            + completion_tokens * config.LLM_COMPLETION_COST_PER_1K_TOKENS
+        ) / 1000
+
+    def to_jsonl(self, **fields: Any) -> str:
+        """One json line per step, per chunk and for the whole run, with the given
+        fields added to each line"""
+        lines = [{"type": "step", **step.model_dump()} for step in self.steps]
+        for chunk in self.chunks:
+            for step in chunk.steps:
+                lines.append(
+                    {"type": "step", "chunk": chunk.chunk, **step.model_dump()}
+                )
+            lines.append({"type": "chunk", **chunk.model_dump(exclude={"steps"})})
+        lines.append(
+            {
+                "type": "run",
+                "seconds": self.seconds,
+                "chunks": len(self.chunks),
+                "cost": self.cost(),
+                "steps": self.totals(),
+            }
+        )
+        return "".join(json.dumps({**fields, **line}) + "\n" for line in lines)
+
+    def to_prometheus(self, prefix: str = "sumo") -> str:
+        """Totals of the run in the Prometheus text exposition format"""
+        lines = []
+
+        def metric(name: str, kind: str, help: str, values: dict) -> None:
+            lines.append(f"# HELP {prefix}_{name} {help}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in values.items():
+                labels = f'{{step="{labels}"}}' if labels else ""
+                lines.append(f"{prefix}_{name}{labels} {value}")
+
+        totals = self.totals()
+        for name, help in [
+            ("count", "Runs of the step"),
+            ("seconds", "Wall time of the step"),
+            ("llm_calls", "LLM calls of the step"),
+            ("prompt_size_tokens", "Estimated size of the prompts of the step"),
+            ("prompt_tokens", "Prompt tokens used by the step"),
+            ("completion_tokens", "Completion tokens used by the step"),
+            ("cache_hits", "LLM calls of the step answered from the cache"),
+            ("retries", "Retried LLM calls of the step"),
+        ]:
+            metric(
+                f"step_{name}_total",
+                "counter",
+                help,
+                {step: total[name] for step, total in totals.items()},
+            )
+
+        last = self.chunks[-1] if self.chunks else ChunkMetrics(chunk=0)
+        metric("run_seconds", "gauge", "Wall time of the run", {"": self.seconds})
+        metric("run_chunks", "gauge", "Chunks of the run", {"": len(self.chunks)})
+        metric("run_cost_dollars", "gauge", "Cost of the run", {"": self.cost()})
+        metric("graph_nodes", "gauge", "Nodes of the graph", {"": last.nodes_after})
+        metric("graph_edges", "gauge", "Edges of the graph", {"": last.edges_after})
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def record_chunk(chunk: int) -> Iterator[ChunkMetrics]:
+    metrics = ChunkMetrics(chunk=chunk)
+    token = _chunk.set(metrics)
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.seconds = time.perf_counter() - start
+        _chunk.reset(token)
+
+
+@contextmanager
+def record_run(metrics: RunMetrics) -> Iterator[RunMetrics]:
+    """Record the steps run outside of the chunks into the metrics of the run"""
+    token = _chunk.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _chunk.reset(token)
+
+
+@contextmanager
+def record_step(name: str) -> Iterator[StepMetrics | None]:
+    chunk = _chunk.get()
+    if chunk is None:
+        yield None
+        return
+
+    metrics = StepMetrics(step=name)
+    token = _step.set(metrics)
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.seconds = time.perf_counter() - start
+        _step.reset(token)
+        chunk.add(metrics)
+
+
+def instrument(name: str) -> Callable:
+    """Record the calls of a sync or async function as a step"""
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with record_step(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with record_step(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_llm_call(
+    prompt_size: int, usage: dict | None, call: LlmCall, retry: bool
+) -> None:
+    step = _step.get()
+    if step is None:
+        return
+
+    step.llm_calls += 1
+    step.prompt_size_tokens += prompt_size
+    step.retries += retry
+    if call.cache_hit:
+        step.cache_hits += 1
+    elif usage:
+        step.prompt_tokens += usage.get("prompt_tokens", 0)
+        step.completion_tokens += usage.get("completion_tokens", 0)
@@ -0,0 +1,70 @@
+import json
+import logging
+
+from pydantic import ValidationError
+
+from sumo.schemas import Edge
+
+logger = logging.getLogger("llm")
+
+
+class EdgeStreamParser:
+    """Incremental parser of the edges of a generated graph. Text is fed as it is
+    generated, and each edge is returned as soon as its json object is complete.
+    Edges that are not valid are skipped, without affecting the others."""
+
+    def __init__(self) -> None:
+        self.edges: list[Edge] = []
+        self.skipped = 0
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+        self._edge: list[str] | None = None
+        self._edge_depth = 0
+
+    def feed(self, text: str) -> list[Edge]:
+        edges = []
+        for char in text:
+            if self._edge is not None:
+                self._edge.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                # edges are the objects of a top-level array, or of an array
+                # in the top-level object
+                if (
+                    char == "{"
+                    and self._edge is None
+                    and self._stack[-1:] == ["["]
+                    and len(self._stack) <= 2
+                ):
+                    self._edge = [char]
+                    self._edge_depth = len(self._stack)
+                self._stack.append(char)
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if self._edge is not None and len(self._stack) == self._edge_depth:
+                    edge = self._parse("".join(self._edge))
+                    self._edge = None
+                    if edge is not None:
+                        edges.append(edge)
+
+        self.edges.extend(edges)
+        return edges
+
+    def _parse(self, text: str) -> Edge | None:
+        try:
+            return Edge.model_validate(json.loads(text))
+        except (json.JSONDecodeError, ValidationError):
+            self.skipped += 1
+            logger.warning(f"Skipping invalid edge {text}")
+            return None
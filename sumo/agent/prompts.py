@@ -20,23 +20,29 @@ GENERATE_KG_SYSTEM_PROMPT = (
     "Format your output as a json with the following schema. "
     "Do not add any other comment before or after the json. "
     "Respond ONLY with a well formed json that can be directly read by a program.\n\n"
-    "{\n"
+    "{{\n"
     "   edges: [\n"
-    "      {\n"
-    '         node_1: Required, an entity object with attributes: {"label": "as per the ontology", "name": "Name of the entity"},\n'
-    '         node_2: Required, an entity object with attributes: {"label": "as per the ontology", "name": "Name of the entity"},\n'
+    "      {{\n"
+    '         node_1: Required, an entity object with attributes: {{"label": "as per the ontology", "name": "Name of the entity"}},\n'
+    '         node_2: Required, an entity object with attributes: {{"label": "as per the ontology", "name": "Name of the entity"}},\n'
     "         relationship: Describe the relationship between node_1 and node_2 as per the context, in a few sentences.\n"
-    "      },\n"
+    "      }},\n"
     "   ]\n"
-    "}\n"
+    "}}\n"
 )
 
 INVESTIGATE_KG_SYSTEM_PROMPT = (
     "You are an expert at investigating and answering questions about a knowledge graph. "
     "Consider a KG with the the following entities:\n{nodes}\n\n"
-    "You have the ability to explore the relationships of the created entities. "
-    "These are the relationships you have already explored:\n{explorations}\n\n"
-    "Explore an entity only if necessary to answer the user's question, otherwise generate the answer."
+    "These are the relationships of the KG most similar to the user's question:\n{relationships}\n\n"
+    "You have the ability to query the KG: explore the relationships of one or more entities, "
+    "explore all the relationships within a few hops of one or more entities, "
+    "find the shortest chain of relationships between two entities, "
+    "and list the entities with most relationships or the most central ones, of all labels or of a given one. "
+    "These are the results of the queries you have already run:\n{explorations}\n\n"
+    "Query the KG only if necessary to answer the user's question, otherwise generate the answer. "
+    "Prefer a single query covering the whole question, e.g. the shortest path to find how two entities are connected, "
+    "and query several entities in a single call rather than one at a time."
 )
 
 DIRECT_LLM_SYSTEM_PROMPT = (
@@ -0,0 +1,357 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator, Iterator
+
+import httpx
+from langchain_core.messages import BaseMessage, BaseMessageChunk
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from sumo.agent.metrics import (
+    LlmCall,
+    current_llm_call,
+    record_llm_call,
+    start_llm_call,
+)
+from sumo.settings import config
+
+logger = logging.getLogger("llm")
+
+# priority lanes, lower goes first
+INTERACTIVE = 0
+BULK = 1
+
+_POLL_SECONDS = 0.05
+_MAX_WAIT_SECONDS = 1.0
+
+
+@lru_cache(maxsize=None)
+def _retryable_errors() -> tuple[type[Exception], ...]:
+    # evaluated only when a call fails, once the OpenAI client has been imported
+    import openai
+
+    return (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
+
+def estimate_prompt_tokens(input: Any) -> int:
+    # about 4 characters per token
+    text = input.to_string() if isinstance(input, PromptValue) else str(input)
+    return len(text) // 4
+
+
+def _usage(output: Any, prompt_size: int) -> dict | None:
+    if not isinstance(output, BaseMessage):
+        return None
+    if usage := output.response_metadata.get("token_usage"):
+        return usage
+    if usage := getattr(output, "usage_metadata", None):
+        return {
+            "prompt_tokens": usage["input_tokens"],
+            "completion_tokens": usage["output_tokens"],
+            "total_tokens": usage["total_tokens"],
+        }
+    if isinstance(output, BaseMessageChunk):
+        # streamed completions of older OpenAI clients come without their usage,
+        # which is then estimated from their text, as for the prompts
+        completion_tokens = estimate_prompt_tokens(output.content)
+        return {
+            "prompt_tokens": prompt_size,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_size + completion_tokens,
+        }
+    return None
+
+
+def _header(headers: httpx.Headers, name: str) -> float | None:
+    try:
+        return float(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Scheduler of the calls to the LLM provider. Calls wait for their turn by
+    priority, for a concurrency slot and for the budget of two token buckets,
+    of requests and of tokens, refilled continuously up to the per-minute limits.
+
+    Limits follow the rate-limit headers of the responses. Concurrency is halved
+    on each 429 response, which also pauses all calls for its retry-after, and
+    grows back by one slot per round of successful calls.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = config.LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = config.LLM_TOKENS_PER_MINUTE,
+        max_concurrency: int = config.LLM_MAX_CONCURRENCY,
+        max_retries: int = config.LLM_MAX_RETRIES,
+    ) -> None:
+        self.requests_per_minute = float(requests_per_minute)
+        self.tokens_per_minute = float(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+
+        self._requests = self.requests_per_minute
+        self._tokens = self.tokens_per_minute
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting: list[tuple[int, int]] = []
+        self._tickets = itertools.count()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(
+            self.requests_per_minute,
+            self._requests + elapsed * self.requests_per_minute / 60,
+        )
+        self._tokens = min(
+            self.tokens_per_minute,
+            self._tokens + elapsed * self.tokens_per_minute / 60,
+        )
+
+    def _try_acquire(self, ticket: tuple[int, int], tokens: int) -> float:
+        """Take the budget of a call if it is its turn, otherwise return the time
+        to wait before trying again"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._waiting[0] != ticket or self.in_flight >= int(self.concurrency):
+                return _POLL_SECONDS
+
+            # a call larger than the bucket only waits for it to be full
+            tokens = min(tokens, self.tokens_per_minute)
+            wait = max(
+                self._paused_until - now,
+                (1 - self._requests) * 60 / self.requests_per_minute,
+                (tokens - self._tokens) * 60 / self.tokens_per_minute,
+            )
+            if wait > 0:
+                return min(wait, _MAX_WAIT_SECONDS)
+
+            self._requests -= 1
+            self._tokens -= tokens
+            self.in_flight += 1
+            heapq.heappop(self._waiting)
+            return 0.0
+
+    def _enqueue(self, priority: int) -> tuple[int, int]:
+        ticket = (priority, next(self._tickets))
+        with self._lock:
+            heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _dequeue(self, ticket: tuple[int, int]) -> None:
+        with self._lock:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+
+    def acquire(self, tokens: int, priority: int = BULK) -> None:
+        ticket = self._enqueue(priority)
+        try:
+            while (wait := self._try_acquire(ticket, tokens)) > 0:
+                time.sleep(wait)
+        except BaseException:
+            self._dequeue(ticket)
+            raise
+
+    async def aacquire(self, tokens: int, priority: int = BULK) -> None:
+        ticket = self._enqueue(priority)
+        try:
+            while (wait := self._try_acquire(ticket, tokens)) > 0:
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._dequeue(ticket)
+            raise
+
+    def release(self, tokens: int, used: int | None, sent: bool) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if not sent:
+                # answered without reaching the provider, the budget is given back
+                self._requests = min(self.requests_per_minute, self._requests + 1)
+                self._tokens = min(self.tokens_per_minute, self._tokens + tokens)
+            elif used is not None:
+                self._tokens = min(self.tokens_per_minute, self._tokens + tokens - used)
+
+    def observe(self, response: httpx.Response) -> None:
+        """Response hook of the HTTP clients of the LLMs"""
+        call = current_llm_call()
+        if call is not None:
+            call.requests += 1
+
+        headers = response.headers
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if (limit := _header(headers, "x-ratelimit-limit-requests")) is not None:
+                self.requests_per_minute = max(limit, 1.0)
+            if (limit := _header(headers, "x-ratelimit-limit-tokens")) is not None:
+                self.tokens_per_minute = max(limit, 1.0)
+            if (
+                remaining := _header(headers, "x-ratelimit-remaining-requests")
+            ) is not None:
+                self._requests = min(self._requests, remaining)
+            if (
+                remaining := _header(headers, "x-ratelimit-remaining-tokens")
+            ) is not None:
+                self._tokens = min(self._tokens, remaining)
+
+            if response.status_code == 429:
+                self.concurrency = max(1.0, self.concurrency / 2)
+                retry_after = _header(headers, "retry-after-ms")
+                retry_after = (
+                    retry_after / 1000
+                    if retry_after is not None
+                    else _header(headers, "retry-after") or config.LLM_BACKOFF_SECONDS
+                )
+                self._paused_until = max(self._paused_until, now + retry_after)
+                logger.warning(
+                    f"Rate limited, pausing {retry_after:.1f}s and lowering "
+                    f"concurrency to {int(self.concurrency)}"
+                )
+            elif response.is_success:
+                self.concurrency = min(
+                    self.max_concurrency, self.concurrency + 1 / self.concurrency
+                )
+
+    async def aobserve(self, response: httpx.Response) -> None:
+        self.observe(response)
+
+    def retry_wait(self, attempt: int, error: Exception) -> float:
+        """Jittered exponential backoff before retrying a failed call, raising the
+        error once the retries are exhausted"""
+        if attempt >= self.max_retries:
+            raise error
+        wait = random.uniform(
+            0,
+            min(
+                config.LLM_BACKOFF_MAX_SECONDS, config.LLM_BACKOFF_SECONDS * 2**attempt
+            ),
+        )
+        logger.warning(f"LLM call failed with {error!r}, retrying in {wait:.1f}s")
+        return wait
+
+
+class ScheduledRunnable(Runnable):
+    """An LLM runnable called through the rate limiter, with retries. Streams are
+    only retried when they fail before yielding anything."""
+
+    def __init__(self, runnable: Runnable, limiter: RateLimiter, priority: int) -> None:
+        self.runnable = runnable
+        self.limiter = limiter
+        self.priority = priority
+
+    @property
+    def InputType(self) -> Any:
+        return self.runnable.InputType
+
+    @property
+    def OutputType(self) -> Any:
+        return self.runnable.OutputType
+
+    def _budget(self, prompt_size: int) -> int:
+        return prompt_size + config.LLM_COMPLETION_TOKENS_ESTIMATE
+
+    def _end(
+        self, prompt_size: int, attempt: int, call: LlmCall, output: Any = None
+    ) -> None:
+        usage = _usage(output, prompt_size) if not call.cache_hit else None
+        self.limiter.release(
+            self._budget(prompt_size),
+            usage.get("total_tokens") if usage else None,
+            call.requests > 0,
+        )
+        record_llm_call(prompt_size, usage, call, attempt > 0)
+
+    def invoke(
+        self, input: Any, config: RunnableConfig | None = None, **kwargs: Any
+    ) -> Any:
+        prompt_size = estimate_prompt_tokens(input)
+        for attempt in itertools.count():
+            self.limiter.acquire(self._budget(prompt_size), self.priority)
+            call, output = start_llm_call(), None
+            try:
+                output = self.runnable.invoke(input, config, **kwargs)
+                return output
+            except _retryable_errors() as e:
+                wait = self.limiter.retry_wait(attempt, e)
+            finally:
+                self._end(prompt_size, attempt, call, output)
+            time.sleep(wait)
+
+    async def ainvoke(
+        self, input: Any, config: RunnableConfig | None = None, **kwargs: Any
+    ) -> Any:
+        prompt_size = estimate_prompt_tokens(input)
+        for attempt in itertools.count():
+            await self.limiter.aacquire(self._budget(prompt_size), self.priority)
+            call, output = start_llm_call(), None
+            try:
+                output = await self.runnable.ainvoke(input, config, **kwargs)
+                return output
+            except _retryable_errors() as e:
+                wait = self.limiter.retry_wait(attempt, e)
+            finally:
+                self._end(prompt_size, attempt, call, output)
+            await asyncio.sleep(wait)
+
+    def stream(
+        self, input: Any, config: RunnableConfig | None = None, **kwargs: Any
+    ) -> Iterator[Any]:
+        prompt_size = estimate_prompt_tokens(input)
+        for attempt in itertools.count():
+            self.limiter.acquire(self._budget(prompt_size), self.priority)
+            # the chunks are aggregated into the whole message, with its usage
+            call, output = start_llm_call(), None
+            try:
+                for chunk in self.runnable.stream(input, config, **kwargs):
+                    output = chunk if output is None else output + chunk
+                    yield chunk
+                return
+            except _retryable_errors() as e:
+                if output is not None:
+                    raise
+                wait = self.limiter.retry_wait(attempt, e)
+            finally:
+                self._end(prompt_size, attempt, call, output)
+            time.sleep(wait)
+
+    async def astream(
+        self, input: Any, config: RunnableConfig | None = None, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        prompt_size = estimate_prompt_tokens(input)
+        for attempt in itertools.count():
+            await self.limiter.aacquire(self._budget(prompt_size), self.priority)
+            call, output = start_llm_call(), None
+            try:
+                async for chunk in self.runnable.astream(input, config, **kwargs):
+                    output = chunk if output is None else output + chunk
+                    yield chunk
+                return
+            except _retryable_errors() as e:
+                if output is not None:
+                    raise
+                wait = self.limiter.retry_wait(attempt, e)
+            finally:
+                self._end(prompt_size, attempt, call, output)
+            await asyncio.sleep(wait)
+
+
+@lru_cache(maxsize=None)
+def get_rate_limiter() -> RateLimiter:
+    return RateLimiter()
@@ -1,26 +1,220 @@
+from typing import List, Literal, Optional
+
 from langchain.pydantic_v1 import BaseModel, Field
 from langchain_core.tools import StructuredTool
 
-from sumo.schemas import Graph
+from sumo.schemas import Edge, Graph
+from sumo.search import text_terms
+from sumo.settings import config
+
+
+def edge_text(edge: Edge) -> str:
+    return f'"{edge.node_1.name}" -> "{edge.node_2.name}": {edge.relationship}'
+
+
+def _limit(results: list[str]) -> list[str]:
+    n_others = len(results) - config.KG_TOOL_RESULTS_LIMIT
+    if n_others > 0:
+        results = results[: config.KG_TOOL_RESULTS_LIMIT]
+        results.append(f"... and {n_others} other results")
+    return results
+
+
+def _quoted(names: list[str]) -> str:
+    return ", ".join(f'"{name}"' for name in names)
 
 
 class ExploreKgToolInput(BaseModel):
-    name: str = Field(description="The name of the entity")
+    names: List[str] = Field(description="The names of the entities")
+    labels: Optional[List[str]] = Field(
+        default=None, description="Only relationships with entities with these labels"
+    )
+    neighbor: Optional[str] = Field(
+        default=None, description="Only relationships with this entity"
+    )
+    cursor: int = Field(
+        default=0,
+        description="Cursor given by a previous exploration to get more relationships",
+    )
 
 
 class ExploreKgTool:
+    """Relationships of nodes, ranked by relevance to the query being answered
+    and returned in pages of KG_TOOL_PAGE_SIZE relationships"""
+
+    def __init__(self, kg: Graph, query: str = "") -> None:
+        self._kg = kg
+        self._query_terms = set(text_terms(query))
+
+    def _score(self, other: str, relationship: str) -> int:
+        return len(
+            self._query_terms.intersection(text_terms(f"{other} {relationship}"))
+        )
+
+    def _explore(
+        self,
+        name: str,
+        labels: list[str] | None,
+        neighbor: str | None,
+        cursor: int,
+    ) -> list[str]:
+        name = self._kg.resolve_node_name(name)
+        if neighbor is not None:
+            neighbor = self._kg.resolve_node_name(neighbor)
+
+        relationships = []
+        for edge in self._kg.get_node_edges(name):
+            other = edge.node_2 if edge.node_1.name == name else edge.node_1
+            if labels is not None and other.label not in labels:
+                continue
+            if neighbor is not None and other.name != neighbor:
+                continue
+            relationships.append((other.name, edge.relationship))
+        if len(relationships) == 0:
+            return [f'Node "{name}" has no active relationships']
+        if cursor >= len(relationships):
+            return [
+                f'Node "{name}" has only {len(relationships)} relationships, '
+                f"none from cursor {cursor}"
+            ]
+
+        # stable sort, so that ties keep the order in which edges were created
+        relationships.sort(key=lambda r: -self._score(*r))
+        page = relationships[cursor : cursor + config.KG_TOOL_PAGE_SIZE]
+        results = [
+            f'with node "{other}": {relationship}' for other, relationship in page
+        ]
+        n_others = len(relationships) - cursor - len(page)
+        if n_others > 0:
+            results.append(
+                f"... and {n_others} other relationships, less related to the query, "
+                f"explore again with cursor {cursor + len(page)} to get them"
+            )
+        return results
+
+    def run(
+        self,
+        names: list[str],
+        labels: list[str] | None = None,
+        neighbor: str | None = None,
+        cursor: int = 0,
+    ) -> dict:
+        key = ""
+        if labels:
+            key += f" with entities labelled {_quoted(labels)}"
+        if neighbor is not None:
+            key += f' with "{neighbor}"'
+        if cursor > 0:
+            key += f" from cursor {cursor}"
+
+        return {
+            name + key: self._explore(name, labels, neighbor, max(cursor, 0))
+            for name in names
+        }
+
+
+class NeighborhoodKgToolInput(BaseModel):
+    names: List[str] = Field(description="The names of the entities")
+    hops: int = Field(
+        default=2,
+        description=f"Maximum distance from the entities, up to {config.KG_TOOL_MAX_HOPS}",
+    )
+    labels: Optional[List[str]] = Field(
+        default=None, description="Only go through entities with these labels"
+    )
+
+
+class NeighborhoodKgTool:
     def __init__(self, kg: Graph) -> None:
         self._kg = kg
 
-    def run(self, name: str) -> dict:
-        return self._kg.get_node_relationships(name)
+    def run(
+        self, names: list[str], hops: int = 2, labels: list[str] | None = None
+    ) -> dict:
+        hops = max(1, min(hops, config.KG_TOOL_MAX_HOPS))
+        edges = self._kg.get_neighborhood(names, hops=hops, labels=labels)
+        key = f"Relationships within {hops} hops of {_quoted(names)}"
+        if labels:
+            key += f" through entities labelled {_quoted(labels)}"
+        if not edges:
+            return {key: ["No relationships found"]}
+        return {key: _limit([edge_text(edge) for edge in edges])}
 
 
-def get_explore_kg_tool(kg: Graph):
+class PathKgToolInput(BaseModel):
+    source: str = Field(description="The name of the first entity")
+    target: str = Field(description="The name of the second entity")
+
+
+class PathKgTool:
+    def __init__(self, kg: Graph) -> None:
+        self._kg = kg
+
+    def run(self, source: str, target: str) -> dict:
+        path = self._kg.get_shortest_path(source, target)
+        key = f'Shortest path between "{source}" and "{target}"'
+        if path is None:
+            return {key: ["The entities are not connected"]}
+        return {key: [edge_text(edge) for edge in path]}
+
+
+class TopNodesKgToolInput(BaseModel):
+    label: Optional[str] = Field(
+        default=None, description="Only list the entities with this label"
+    )
+    k: int = Field(default=20, description="The number of entities to list")
+    by: Literal["degree", "pagerank"] = Field(
+        default="degree",
+        description='"degree" for the entities with most relationships, "pagerank" for the most central ones',
+    )
+
+
+class TopNodesKgTool:
+    def __init__(self, kg: Graph) -> None:
+        self._kg = kg
+
+    def run(self, label: str | None = None, k: int = 20, by: str = "degree") -> dict:
+        k = max(1, min(k, config.KG_TOOL_RESULTS_LIMIT))
+        nodes = self._kg.get_top_nodes(k, label=label, by=by)
+        key = "Entities" + (f' with label "{label}"' if label else "")
+        key += " with most relationships" if by == "degree" else " most central"
+        if not nodes:
+            return {key: ["No entities found"]}
+        return {key: [f'"{name}": {degree} relationships' for name, degree in nodes]}
+
+
+def get_explore_kg_tool(kg: Graph, query: str = ""):
     return StructuredTool(
         name="explore_kg_tool",
-        description="Explore all the relationships of a single node of the knowledge graph",
+        description="Explore the relationships of one or more nodes of the knowledge graph, most relevant first",
         args_schema=ExploreKgToolInput,
-        func=ExploreKgTool(kg=kg).run,
+        func=ExploreKgTool(kg=kg, query=query).run,
         return_direct=False,
     )
+
+
+def get_kg_tools(kg: Graph, query: str = "") -> list[StructuredTool]:
+    return [
+        get_explore_kg_tool(kg, query),
+        StructuredTool(
+            name="neighborhood_kg_tool",
+            description="Explore the relationships between all the nodes within a few hops of one or more nodes of the knowledge graph",
+            args_schema=NeighborhoodKgToolInput,
+            func=NeighborhoodKgTool(kg=kg).run,
+            return_direct=False,
+        ),
+        StructuredTool(
+            name="path_kg_tool",
+            description="Find how two nodes of the knowledge graph are connected, through the shortest chain of relationships",
+            args_schema=PathKgToolInput,
+            func=PathKgTool(kg=kg).run,
+            return_direct=False,
+        ),
+        StructuredTool(
+            name="top_nodes_kg_tool",
+            description="List the nodes of the knowledge graph with most relationships, or the most central ones by PageRank, optionally only those with a given label",
+            args_schema=TopNodesKgToolInput,
+            func=TopNodesKgTool(kg=kg).run,
+            return_direct=False,
+        ),
+    ]
@@ -0,0 +1,111 @@
+from functools import cached_property
+
+import numpy as np
+
+# metrics of the nodes, as named in the node table of the graph
+NODE_METRICS = ["degree", "pagerank", "component", "community"]
+
+_PAGERANK_DAMPING = 0.85
+_PAGERANK_TOLERANCE = 1e-8
+_MAX_ITERATIONS = 100
+# label propagation does not always converge, most communities settle in a few
+# rounds
+_COMMUNITY_ITERATIONS = 10
+
+
+class GraphAnalytics:
+    """Metrics of the nodes of a graph, computed in vectorized form on its
+    undirected adjacency matrix in compressed sparse row form. Parallel edges are
+    kept as weights, self-loops count once. Each metric is computed on first
+    access."""
+
+    def __init__(self, n_nodes: int, ids_1: np.ndarray, ids_2: np.ndarray) -> None:
+        self.n_nodes = n_nodes
+        loops = ids_1 == ids_2
+        sources = np.concatenate((ids_1, ids_2[~loops]))
+        targets = np.concatenate((ids_2, ids_1[~loops]))
+        order = np.argsort(sources, kind="stable")
+        self.indices = targets[order]
+        self.indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n_nodes), out=self.indptr[1:])
+        # row of each stored entry, to reduce over the neighbors of all the
+        # nodes at once
+        self._rows = sources[order]
+
+    @cached_property
+    def degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    @cached_property
+    def pagerank(self) -> np.ndarray:
+        n = self.n_nodes
+        if n == 0:
+            return np.empty(0)
+
+        degree = self.degree
+        dangling = degree == 0
+        ranks = np.full(n, 1 / n)
+        for _ in range(_MAX_ITERATIONS):
+            shares = np.divide(ranks, degree, out=np.zeros(n), where=~dangling)
+            received = np.bincount(
+                self._rows, weights=shares[self.indices], minlength=n
+            )
+            updated = (1 - _PAGERANK_DAMPING) / n + _PAGERANK_DAMPING * (
+                received + ranks[dangling].sum() / n
+            )
+            converged = np.abs(updated - ranks).sum() < _PAGERANK_TOLERANCE
+            ranks = updated
+            if converged:
+                break
+        return ranks
+
+    @cached_property
+    def component(self) -> np.ndarray:
+        """Connected component of each node, numbered in order of their first node"""
+        labels = np.arange(self.n_nodes)
+        nonempty = np.flatnonzero(self.degree)
+        while True:
+            # each node takes the smallest label among its neighbors, then labels
+            # are followed to their own label to shortcut long chains
+            updated = labels.copy()
+            updated[nonempty] = np.minimum(
+                labels[nonempty],
+                np.minimum.reduceat(labels[self.indices], self.indptr[nonempty]),
+            )
+            updated = updated[updated]
+            if np.array_equal(updated, labels):
+                break
+            labels = updated
+        return np.unique(labels, return_inverse=True)[1]
+
+    @cached_property
+    def community(self) -> np.ndarray:
+        """Community of each node by label propagation: nodes repeatedly take the
+        most frequent label among their neighbors and themselves, the smallest on
+        ties, for up to _COMMUNITY_ITERATIONS rounds. Numbered in order of their
+        first node."""
+        n = self.n_nodes
+        labels = np.arange(n)
+        rows = np.concatenate((self._rows, labels))
+        for _ in range(_COMMUNITY_ITERATIONS):
+            # sorted by node, then by label
+            keys, counts = np.unique(
+                rows * n + np.concatenate((labels[self.indices], labels)),
+                return_counts=True,
+            )
+            key_rows = keys // n
+            starts = np.flatnonzero(np.diff(key_rows, prepend=-1))
+            most = np.maximum.reduceat(counts, starts)
+            candidates = np.flatnonzero(
+                counts == np.repeat(most, np.diff(starts, append=len(keys)))
+            )
+            best = candidates[np.diff(key_rows[candidates], prepend=-1) != 0]
+
+            updated = keys[best] % n
+            if np.array_equal(updated, labels):
+                break
+            labels = updated
+        return np.unique(labels, return_inverse=True)[1]
+
+    def node_metrics(self) -> dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in NODE_METRICS}
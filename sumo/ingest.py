@@ -0,0 +1,237 @@
+"""Batch ingestion of a corpus of documents into a single knowledge graph.
+
+    python -m sumo.ingest DOCS --ontology ontology.json --output graph.kg
+
+DOCS is a directory of text files, or a JSONL file (`-` for stdin) with one
+document per line. The ontology file holds the json of an Ontology.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from sumo.agent import LlmAgent
+from sumo.agent.chunking import read_text
+from sumo.agent.metrics import RunMetrics
+from sumo.schemas import Graph, Ontology
+from sumo.settings import config
+
+logger = logging.getLogger("ingest")
+
+
+def read_directory(
+    path: str, pattern: str = "**/*.txt"
+) -> Iterator[tuple[str, Iterable[str]]]:
+    # files are read lazily, piece by piece, as their chunks are extracted
+    for file in sorted(Path(path).glob(pattern)):
+        if file.is_file():
+            yield str(file), read_text(str(file))
+
+
+def read_jsonl(path: str, text_field: str = "text") -> Iterator[tuple[str, str]]:
+    # malformed lines are skipped, as documents that fail to be extracted
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            try:
+                doc = json.loads(line)
+                text = doc[text_field]
+                if not isinstance(text, str):
+                    raise TypeError(f"{text_field!r} is not a string")
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"Skipping line {i + 1} of {path}: {e!r}")
+                continue
+            yield str(doc.get("id", i)), text
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def read_documents(
+    path: str, pattern: str = "**/*.txt", text_field: str = "text"
+) -> Iterator[tuple[str, str | Iterable[str]]]:
+    if path != "-" and os.path.isdir(path):
+        return read_directory(path, pattern)
+    return read_jsonl(path, text_field)
+
+
+class Throughput:
+    """Counters of the documents, chunks and edges ingested since the start"""
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.docs = 0
+        self.chunks = 0
+        self.edges = 0
+
+    def add(self, chunks: int, edges: int) -> None:
+        self.docs += 1
+        self.chunks += chunks
+        self.edges += edges
+
+    def __str__(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return (
+            f"{self.docs} docs ({self.docs / elapsed:.2f} docs/s), "
+            f"{self.chunks} chunks ({self.chunks / elapsed:.2f} chunks/s), "
+            f"{self.edges} edges ({self.edges / elapsed:.2f} edges/s) "
+            f"in {elapsed:.1f}s"
+        )
+
+
+def _extract(
+    ontology: Ontology, text: str | Iterable[str], chunk_workers: int, resume: bool
+) -> tuple[Graph, int, RunMetrics]:
+    # each document is extracted into a graph of its own, entities shared with
+    # other documents are reconciled by entity resolution when merging
+    agent = LlmAgent(ontology=ontology, kg=Graph(edges=[]))
+    state = agent.run(
+        text, max_workers=chunk_workers, resume=resume, route="generate_kg"
+    )
+    return state["kg"], state["chunks"], state["metrics"]
+
+
+def ingest(
+    documents: Iterator[tuple[str, str | Iterable[str]]],
+    ontology: Ontology,
+    kg: Graph,
+    output: str | None = None,
+    workers: int = config.INGEST_MAX_WORKERS,
+    chunk_workers: int = 1,
+    resume: bool = False,
+    metrics: str | None = None,
+) -> Throughput:
+    """Extract the documents on a pool of `workers` threads and merge their
+    graphs into `kg` in document order, saving it to `output` after each one.
+    The ids of the documents saved are listed in `output` + ".done", and with
+    `resume` the ones listed are skipped. The metrics of each document are
+    appended as JSONL to `metrics`."""
+    throughput = Throughput()
+    done_path = f"{output}.done" if output else None
+    done: set[str] = set()
+    if resume and done_path and os.path.exists(done_path):
+        with open(done_path, encoding="utf-8") as f:
+            done = set(f.read().splitlines())
+        logger.info(f"Skipping the {len(done)} documents listed in {done_path}")
+    elif done_path:
+        open(done_path, "w").close()
+    # at most `workers` documents are queued beyond the ones being extracted,
+    # so that the corpus is streamed rather than read in memory
+    pending: deque[tuple[str, Future]] = deque()
+
+    def merge_next() -> None:
+        doc_id, future = pending.popleft()
+        try:
+            doc_kg, chunks, doc_metrics = future.result()
+        except Exception:
+            logger.exception(f"Failed to ingest document {doc_id}")
+            return
+
+        n_edges = len(kg.edges)
+        kg.merge_edges(doc_kg)
+        if output:
+            kg.save(output)
+            # a document saved but not listed yet is merged again on resume,
+            # where its edges are found to be in the graph already
+            with open(done_path, "a", encoding="utf-8") as f:
+                f.write(doc_id + "\n")
+        if metrics:
+            with open(metrics, "a") as f:
+                f.write(doc_metrics.to_jsonl(document=doc_id))
+        throughput.add(chunks, len(kg.edges) - n_edges)
+        logger.info(f"Ingested {doc_id}: {throughput}")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for doc_id, text in documents:
+                if doc_id in done:
+                    continue
+                if len(pending) >= 2 * workers:
+                    merge_next()
+                pending.append(
+                    (
+                        doc_id,
+                        executor.submit(
+                            _extract, ontology, text, chunk_workers, resume
+                        ),
+                    )
+                )
+        finally:
+            # the documents already extracted are merged even if reading the
+            # next ones failed
+            while pending:
+                merge_next()
+
+    return throughput
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m sumo.ingest",
+        description="Build a knowledge graph out of a corpus of documents",
+    )
+    parser.add_argument(
+        "documents", help="directory of text files, or JSONL file ('-' for stdin)"
+    )
+    parser.add_argument("--ontology", required=True, help="ontology json file")
+    parser.add_argument("--output", required=True, help="graph file to write")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=config.INGEST_MAX_WORKERS,
+        help="documents extracted concurrently",
+    )
+    parser.add_argument(
+        "--chunk-workers",
+        type=int,
+        default=config.AGENT_MAX_WORKERS,
+        help="chunks of a document extracted concurrently",
+    )
+    parser.add_argument(
+        "--pattern", default="**/*.txt", help="glob of the files of a directory"
+    )
+    parser.add_argument(
+        "--text-field", default="text", help="field of the text of JSONL documents"
+    )
+    parser.add_argument("--metrics", help="JSONL file to append run metrics to")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="extend the output graph, skipping the documents already saved to it "
+        "and resuming from checkpoints if enabled",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    ontology = Ontology.model_validate_json(Path(args.ontology).read_text())
+    if args.resume and os.path.exists(args.output):
+        kg = Graph.load(args.output)
+        logger.info(f"Resuming from {args.output} with {len(kg.edges)} edges")
+    else:
+        kg = Graph(edges=[])
+        kg.save(args.output)
+
+    throughput = ingest(
+        read_documents(args.documents, args.pattern, args.text_field),
+        ontology,
+        kg,
+        output=args.output,
+        workers=args.workers,
+        chunk_workers=args.chunk_workers,
+        resume=args.resume,
+        metrics=args.metrics,
+    )
+    logger.info(f"Done: {throughput}")
+
+
+if __name__ == "__main__":
+    main()
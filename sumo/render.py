@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+from pyvis.network import Network
+
+_COLORS_ROTATION = [
+    "#00bfff",  # DeepSkyBlue
+    "#ff7f50",  # Coral
+    "#32cd32",  # LimeGreen
+    "#ff69b4",  # HotPink
+    "#8a2be2",  # BlueViolet
+    "#ff4500",  # OrangeRed
+    "#2e8b57",  # SeaGreen
+    "#dda0dd",  # Plum
+    "#ff6347",  # Tomato
+    "#4682b4",  # SteelBlue
+    "#9acd32",  # YellowGreen
+    "#ff1493",  # DeepPink
+    "#00ced1",  # DarkTurquoise
+    "#7b68ee",  # MediumSlateBlue
+    "#dc143c",  # Crimson
+]
+
+
+def get_colors_map(labels: pd.Series) -> dict[str, str]:
+    return {
+        label: _COLORS_ROTATION[i % len(_COLORS_ROTATION)]
+        for i, label in enumerate(labels.unique())
+    }
+
+
+def get_sizes(ranking: np.ndarray, max_size: int = 5) -> np.ndarray:
+    """Node sizes from 1 to `max_size`, proportional to the ranking of the nodes"""
+    top = ranking.max(initial=0)
+    if top <= 0:
+        return np.ones(len(ranking), dtype=int)
+    return 1 + np.round((max_size - 1) * ranking / top).astype(int)
+
+
+def select_subgraph(
+    df_nodes: pd.DataFrame,
+    df_edges: pd.DataFrame,
+    max_nodes: int | None = None,
+    center_ids: list[int] | None = None,
+    hops: int = 1,
+    labels: list[str] | None = None,
+    ranking: np.ndarray | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Restrict the node and edge tables to the nodes with the given labels, to the
+    ego network of `hops` hops around the center nodes and to the `max_nodes`
+    top nodes by `ranking` (degree in the selection when not provided)"""
+    n_nodes = len(df_nodes)
+    ids_1 = df_edges["id_1"].to_numpy()
+    ids_2 = df_edges["id_2"].to_numpy()
+
+    keep = np.ones(n_nodes, dtype=bool)
+    if labels:
+        keep &= df_nodes["label"].isin(labels).to_numpy()
+    edges_mask = keep[ids_1] & keep[ids_2]
+
+    if center_ids is not None:
+        reached = np.zeros(n_nodes, dtype=bool)
+        reached[center_ids] = True
+        reached &= keep
+        for _ in range(hops):
+            frontier = edges_mask & (reached[ids_1] | reached[ids_2])
+            expanded = reached.copy()
+            expanded[ids_1[frontier]] = True
+            expanded[ids_2[frontier]] = True
+            if (expanded == reached).all():
+                break
+            reached = expanded
+        keep &= reached
+        edges_mask &= keep[ids_1] & keep[ids_2]
+
+    if max_nodes is not None and keep.sum() > max_nodes:
+        if ranking is None:
+            ranking = np.bincount(ids_1[edges_mask], minlength=n_nodes) + np.bincount(
+                ids_2[edges_mask], minlength=n_nodes
+            )
+        candidates = np.flatnonzero(keep)
+        top = candidates[np.argsort(-ranking[candidates], kind="stable")[:max_nodes]]
+        keep = np.zeros(n_nodes, dtype=bool)
+        keep[top] = True
+        edges_mask &= keep[ids_1] & keep[ids_2]
+
+    return df_nodes[keep], df_edges[edges_mask]
+
+
+def collapse_labels(
+    df_nodes: pd.DataFrame, df_edges: pd.DataFrame
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Collapse the nodes of each label into a single super-node, and their edges
+    into one edge per pair of labels"""
+    codes, labels = pd.factorize(df_nodes["label"])
+    sizes = np.bincount(codes, minlength=len(labels))
+    super_nodes = pd.DataFrame(
+        {
+            "label": labels,
+            "name": [f"{label} ({size} nodes)" for label, size in zip(labels, sizes)],
+            # node sizes grow logarithmically with the number of collapsed nodes
+            "count": np.log2(sizes + 1).round().astype(int) + 1,
+            "id": np.arange(len(labels)),
+        }
+    )
+
+    label_of_node = pd.Series(codes, index=df_nodes["id"].to_numpy())
+    super_edges = (
+        pd.DataFrame(
+            {
+                "id_1": label_of_node.loc[df_edges["id_1"]].to_numpy(),
+                "id_2": label_of_node.loc[df_edges["id_2"]].to_numpy(),
+            }
+        )
+        .value_counts()
+        .rename("count")
+        .reset_index()
+    )
+    super_edges["relationship"] = super_edges["count"].astype(str) + " relationships"
+    return super_nodes, super_edges
+
+
+def render_html(
+    df_nodes: pd.DataFrame, df_edges: pd.DataFrame, colors_map: dict[str, str]
+) -> str:
+    # pyvis options are built column-wise, undirected edges between the same
+    # pair of nodes are drawn once as add_edge would do
+    nodes = pd.DataFrame(
+        {
+            "color": df_nodes["label"].map(colors_map),
+            "size": df_nodes["count"] * 10,
+            "id": df_nodes["id"],
+            "label": df_nodes["name"],
+            "shape": "dot",
+        }
+    ).to_dict("records")
+    edges = (
+        df_edges.assign(
+            pair_1=np.minimum(df_edges["id_1"], df_edges["id_2"]),
+            pair_2=np.maximum(df_edges["id_1"], df_edges["id_2"]),
+        )
+        .drop_duplicates(["pair_1", "pair_2"])
+        .rename(columns={"relationship": "label", "id_1": "from", "id_2": "to"})[
+            ["label", "from", "to"]
+        ]
+        .to_dict("records")
+    )
+
+    net = Network(notebook=False, cdn_resources="remote")
+    net.nodes = nodes
+    net.edges = edges
+    net.node_ids = [node["id"] for node in nodes]
+    net.node_map = dict(zip(net.node_ids, nodes))
+    return net.generate_html()
@@ -0,0 +1,186 @@
+import hashlib
+import re
+import struct
+from collections import defaultdict
+from functools import lru_cache
+
+from sumo.search import normalize_text
+
+_NON_ALPHANUMERIC_PATTERN = re.compile(r"[\W_]+")
+_DIGITS_PATTERN = re.compile(r"\d+")
+
+_MINHASH_BANDS = 8
+_MINHASH_ROWS = 4
+_MINHASH_WORDS = struct.Struct("<16I")
+# buckets are purged past this size to bound the candidates of common names
+_MAX_BUCKET_SIZE = 32
+# characters an abbreviation leaves out of the word it abbreviates
+_MIN_ABBREVIATED = 2
+
+
+def entity_key(name: str) -> str:
+    return _NON_ALPHANUMERIC_PATTERN.sub("", normalize_text(name))
+
+
+def _trigrams(key: str) -> frozenset[str]:
+    padded = f" {key} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+@lru_cache(maxsize=None)
+def _gram_hashes(gram: str) -> tuple[int, ...]:
+    # 32 independent 32-bit hashes of the trigram, one per MinHash row
+    data = gram.encode()
+    return _MINHASH_WORDS.unpack(
+        hashlib.blake2b(data, digest_size=64).digest()
+    ) + _MINHASH_WORDS.unpack(
+        hashlib.blake2b(data, digest_size=64, person=b"minhash").digest()
+    )
+
+
+def _minhash_bands(grams: frozenset[str]) -> list[tuple]:
+    if not grams:
+        return []
+    signature = list(map(min, zip(*map(_gram_hashes, grams))))
+    return [
+        (band, *signature[band * _MINHASH_ROWS : (band + 1) * _MINHASH_ROWS])
+        for band in range(_MINHASH_BANDS)
+    ]
+
+
+def entity_tokens(name: str) -> tuple[str, ...]:
+    return tuple(filter(None, _NON_ALPHANUMERIC_PATTERN.split(normalize_text(name))))
+
+
+def _compatible_tokens(tokens: tuple[str, ...], other: tuple[str, ...]) -> bool:
+    """Whether the words differing between two similar names are abbreviations or
+    initials of each other (e.g. "corp" and "corporation"), rather than different
+    words of a similar spelling (e.g. "alessandro" and "alessandra")"""
+    only = [t for t in tokens if t not in other]
+    other_only = [t for t in other if t not in tokens]
+    for token, other_token in zip(only, other_only):
+        short, long = sorted([token, other_token], key=len)
+        # a prefix a single character short is more often a different word
+        if not long.startswith(short) or len(long) - len(short) < _MIN_ABBREVIATED:
+            return False
+    # words without a counterpart can only be initials
+    unpaired = only[len(other_only) :] + other_only[len(only) :]
+    return all(len(token) == 1 for token in unpaired)
+
+
+class EntityResolver:
+    """Maps entity names to canonical names of the same label.
+
+    Names are first compared on a normalized key (case, accents, spaces and
+    punctuation removed), then candidates sharing a MinHash-LSH bucket are
+    accepted when the Jaccard similarity of their trigrams reaches `threshold`
+    and the words they differ by are abbreviations or initials of each other.
+    """
+
+    def __init__(self, threshold: float) -> None:
+        self.threshold = threshold
+        self.aliases: dict[str, str] = {}
+
+        self._labels: dict[str | None, None] = {}
+        self._label_aliases: dict[tuple[str | None, str], str] = {}
+        self._canonical_keys: dict[tuple[str | None, str], str] = {}
+        self._canonical_labels: set[tuple[str | None, str]] = set()
+        self._canonical_grams: dict[str, frozenset[str]] = {}
+        self._canonical_tokens: dict[str, tuple[str, ...]] = {}
+        self._canonical_bands: dict[str, tuple[str, list[tuple]]] = {}
+        self._buckets: dict[tuple, list[str]] = defaultdict(list)
+
+    def _match(
+        self,
+        label: str | None,
+        key: str,
+        grams: frozenset[str],
+        tokens: tuple[str, ...],
+        bands: list[tuple],
+    ) -> tuple[str | None, float]:
+        if (label, key) in self._canonical_keys:
+            return self._canonical_keys[(label, key)], 1.0
+        if self.threshold >= 1:
+            return None, 0.0
+
+        digits = _DIGITS_PATTERN.findall(key)
+        best, best_similarity = None, self.threshold
+        seen = set()
+        for band in bands:
+            for candidate in self._buckets.get((label, *band), ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+
+                candidate_grams = self._canonical_grams[candidate]
+                similarity = len(grams & candidate_grams) / len(grams | candidate_grams)
+                if (
+                    similarity >= best_similarity
+                    and digits
+                    == _DIGITS_PATTERN.findall(self._canonical_bands[candidate][0])
+                    and _compatible_tokens(tokens, self._canonical_tokens[candidate])
+                ):
+                    best, best_similarity = candidate, similarity
+        return best, best_similarity
+
+    def add(self, name: str, label: str | None = None) -> None:
+        """Register a name as canonical for its label, without matching it"""
+        if (label, name) in self._canonical_labels:
+            return
+        if name not in self._canonical_grams:
+            key = entity_key(name)
+            grams = self._canonical_grams[name] = _trigrams(key)
+            self._canonical_tokens[name] = entity_tokens(name)
+            self._canonical_bands[name] = (key, _minhash_bands(grams))
+        key, bands = self._canonical_bands[name]
+
+        self._labels[label] = None
+        self._canonical_labels.add((label, name))
+        self._canonical_keys.setdefault((label, key), name)
+        for band in bands:
+            bucket = self._buckets[(label, *band)]
+            if len(bucket) < _MAX_BUCKET_SIZE:
+                bucket.append(name)
+
+    def lookup(self, name: str, label: str | None = None) -> str | None:
+        """Canonical name of an entity, of any label if none is given"""
+        if name in self._canonical_grams:
+            return name
+
+        labels = list(self._labels) if label is None else [label]
+        for label in labels:
+            if (label, name) in self._label_aliases:
+                return self._label_aliases[(label, name)]
+
+        key = entity_key(name)
+        grams, tokens = _trigrams(key), entity_tokens(name)
+        bands = _minhash_bands(grams)
+        best, best_similarity = None, 0.0
+        for label in labels:
+            candidate, similarity = self._match(label, key, grams, tokens, bands)
+            if candidate is not None and similarity > best_similarity:
+                best, best_similarity = candidate, similarity
+        return best
+
+    def resolve(self, name: str, label: str | None = None) -> str:
+        if name in self._canonical_grams:
+            # the same name is the same entity, whatever its label
+            self.add(name, label)
+            return name
+        if (label, name) in self._label_aliases:
+            return self._label_aliases[(label, name)]
+
+        key = entity_key(name)
+        grams, tokens = _trigrams(key), entity_tokens(name)
+        bands = _minhash_bands(grams)
+        canonical, _ = self._match(label, key, grams, tokens, bands)
+        if canonical is not None:
+            self._label_aliases[(label, name)] = canonical
+            self.aliases[name] = canonical
+            return canonical
+
+        self._canonical_grams[name] = grams
+        self._canonical_tokens[name] = tokens
+        self._canonical_bands[name] = (key, bands)
+        self.add(name, label)
+        return name
@@ -1,8 +1,24 @@
-from typing import Dict, List, Union
+import threading
+from array import array
+from bisect import bisect_left
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Sequence, Union
 
-import pandas as pd
-from pydantic import BaseModel, Field
-from pyvis.network import Network
+import numpy as np
+from pydantic import BaseModel, Field, PrivateAttr, field_serializer
+
+from sumo.analytics import GraphAnalytics
+from sumo.resolution import EntityResolver
+from sumo.search import EmbeddingIndex, LexicalIndex
+from sumo.settings import config
+from sumo.storage import COLUMNS, DICTIONARIES, GraphFile
+
+# pandas and pyvis are only imported when the graph is first converted to tables
+# or rendered, to keep the import of the schemas light
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from sumo.tables import GraphTables
 
 
 class Ontology(BaseModel):
@@ -36,118 +52,741 @@ class Edge(BaseModel):
     )
 
 
+class Prefix(Sequence):
+    """Read-only view of the first `length` items of an append-only list or array,
+    unaffected by the items appended to it afterwards"""
+
+    __slots__ = ("_values", "_length")
+
+    def __init__(self, values: Sequence, length: int) -> None:
+        self._values = values
+        self._length = length
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int | slice) -> Any:
+        if isinstance(index, slice):
+            return self._values[slice(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("index out of range")
+        return self._values[index]
+
+    def __iter__(self) -> Iterator:
+        return islice(self._values, self._length)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return np.asarray(self._values[: self._length], dtype=dtype)
+
+
+class EdgeTable(Sequence[Edge]):
+    """Edges stored as parallel columns of ids into interned string dictionaries,
+    built as Edge objects only when accessed"""
+
+    def __init__(
+        self,
+        dictionaries: dict[str, list[str]] | None = None,
+        columns: dict[str, array] | None = None,
+    ) -> None:
+        self.dictionaries = dictionaries or {name: [] for name in DICTIONARIES}
+        self.columns = columns or {name: array("i") for name in COLUMNS}
+        self._ids: dict[str, dict[str, int]] | None = None
+
+    def __len__(self) -> int:
+        return len(self.columns["node_1"])
+
+    def __getitem__(self, index: int | slice) -> Edge | list[Edge]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        names = self.dictionaries["names"]
+        labels = self.dictionaries["labels"]
+        columns = self.columns
+        return Edge.model_construct(
+            node_1=Node.model_construct(
+                label=labels[columns["label_1"][index]],
+                name=names[columns["node_1"][index]],
+            ),
+            node_2=Node.model_construct(
+                label=labels[columns["label_2"][index]],
+                name=names[columns["node_2"][index]],
+            ),
+            relationship=self.dictionaries["relationships"][
+                columns["relationship"][index]
+            ],
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, EdgeTable):
+            return NotImplemented
+        # sliced, as snapshots hold prefixes of the dictionaries and columns
+        return all(
+            self.dictionaries[name][:] == other.dictionaries[name][:]
+            for name in DICTIONARIES
+        ) and all(self.columns[name][:] == other.columns[name][:] for name in COLUMNS)
+
+    def __getstate__(self) -> dict:
+        # the reverse lookups are rebuilt on demand
+        return {**self.__dict__, "_ids": None}
+
+    def _get_ids(self, dictionary: str) -> dict[str, int]:
+        if self._ids is None:
+            self._ids = {
+                name: {v: i for i, v in enumerate(values)}
+                for name, values in self.dictionaries.items()
+            }
+        return self._ids[dictionary]
+
+    def lookup(self, dictionary: str, value: str) -> int | None:
+        value_id = self._get_ids(dictionary).get(value)
+        # the reverse lookups of a snapshot are shared with its table, which may
+        # have interned more values since
+        if value_id is not None and value_id >= len(self.dictionaries[dictionary]):
+            return None
+        return value_id
+
+    def snapshot(self) -> "EdgeTable":
+        """Read-only view of the table as it is now, sharing its storage"""
+        # edges are counted before the dictionaries, whose values are interned
+        # before the edges referring to them are appended
+        n_edges = min(len(column) for column in self.columns.values())
+        dictionaries = {
+            name: Prefix(values, len(values))
+            for name, values in self.dictionaries.items()
+        }
+        table = EdgeTable(
+            dictionaries,
+            {name: Prefix(column, n_edges) for name, column in self.columns.items()},
+        )
+        self._get_ids("names")
+        table._ids = self._ids
+        return table
+
+    def intern(self, dictionary: str, value: str) -> int:
+        ids = self._get_ids(dictionary)
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = ids[value] = len(self.dictionaries[dictionary])
+            self.dictionaries[dictionary].append(value)
+        return value_id
+
+    def append_ids(
+        self, node_1: int, label_1: int, node_2: int, label_2: int, relationship: int
+    ) -> None:
+        self.columns["node_1"].append(node_1)
+        self.columns["label_1"].append(label_1)
+        self.columns["node_2"].append(node_2)
+        self.columns["label_2"].append(label_2)
+        self.columns["relationship"].append(relationship)
+
+    def append(self, edge: Edge) -> None:
+        self.append_ids(
+            self.intern("names", edge.node_1.name),
+            self.intern("labels", edge.node_1.label),
+            self.intern("names", edge.node_2.name),
+            self.intern("labels", edge.node_2.label),
+            self.intern("relationships", edge.relationship),
+        )
+
+    def extend(self, edges: Sequence[Edge]) -> None:
+        for edge in edges:
+            self.append(edge)
+
+
 class Graph(BaseModel):
+    # stored as an EdgeTable, whose "names" dictionary ids are the node ids
     edges: List[Edge]
 
+    # incremental indexes, built lazily and kept in sync by merge_edges. They are
+    # append-only, so that snapshots can share them, reading them up to their own
+    # edges only.
+    _indexed_edges: int = PrivateAttr(default=0)
+    _node_edges: List[array] = PrivateAttr(default_factory=list)
+    _label_nodes: Dict[int, array] = PrivateAttr(default_factory=dict)
+    _node_labels: set[tuple[int, int]] = PrivateAttr(default_factory=set)
+    _name_index: LexicalIndex = PrivateAttr(default_factory=LexicalIndex)
+    _resolver: EntityResolver = PrivateAttr(
+        default_factory=lambda: EntityResolver(config.ENTITY_RESOLUTION_THRESHOLD)
+    )
+    _edge_keys: set[tuple[int, int, int]] = PrivateAttr(default_factory=set)
+    # embeddings of node names and edge texts, caught up with the edges merged
+    # only when searched
+    _node_embeddings: EmbeddingIndex = PrivateAttr(
+        default_factory=lambda: EmbeddingIndex(config.EMBEDDING_DIM)
+    )
+    _edge_embeddings: EmbeddingIndex = PrivateAttr(
+        default_factory=lambda: EmbeddingIndex(config.EMBEDDING_DIM)
+    )
+
+    # held while the indexes are updated or searched, by the graph and its
+    # snapshots
+    _lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
+    # for snapshots, the graph they are a version of, and the number of nodes of
+    # each label at that version
+    _source: "Graph | None" = PrivateAttr(default=None)
+    _label_sizes: dict[int, int] | None = PrivateAttr(default=None)
+
+    # tabular and html representations, cached until the version changes
+    _version: int = PrivateAttr(default=0)
+    _tables: "GraphTables | None" = PrivateAttr(default=None)
+    _analytics: tuple[int, GraphAnalytics] | None = PrivateAttr(default=None)
+    _pandas_cache: tuple | None = PrivateAttr(default=None)
+    _html_cache: tuple[tuple, str] | None = PrivateAttr(default=None)
+
+    # graph file last saved or loaded
+    _file: GraphFile | None = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        if not isinstance(self.edges, EdgeTable):
+            table = EdgeTable()
+            table.extend(self.edges)
+            self.edges = table
+
+    @field_serializer("edges")
+    def _serialize_edges(self, edges: Sequence[Edge]) -> list[Edge]:
+        return list(edges)
+
+    def __eq__(self, other: object) -> bool:
+        # the private attributes are indexes and caches of the edges
+        if not isinstance(other, Graph):
+            return NotImplemented
+        return self.edges == other.edges
+
+    def __getstate__(self) -> dict:
+        state = super().__getstate__()
+        state["__pydantic_private__"] = {**state["__pydantic_private__"], "_lock": None}
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        super().__setstate__(state)
+        if set(self.__private_attributes__) != set(self.__pydantic_private__ or {}):
+            # snapshots pickled with a previous version of the indexes
+            self.__pydantic_private__ = {
+                name: attr.get_default()
+                for name, attr in self.__private_attributes__.items()
+            }
+            self.model_post_init(None)
+        elif self._lock is None:
+            self._lock = threading.RLock()
+
+    def __deepcopy__(self, memo: dict | None = None) -> "Graph":
+        # a copy has storage of its own, guarded by a lock of its own
+        memo = {} if memo is None else memo
+        memo.setdefault(id(self._lock), threading.RLock())
+        return super().__deepcopy__(memo)
+
+    def snapshot(self) -> "Graph":
+        """Read-only version of the graph as it is now, at no copy cost: it shares
+        the edges and indexes of the graph, which can keep merging edges meanwhile
+        without affecting the readers of the snapshot (e.g. from other threads)"""
+        if self._source is not None:
+            return self
+
+        with self._lock:
+            self.build_indexes()
+            graph = Graph.model_construct(edges=self.edges.snapshot())
+            for name in [
+                "_indexed_edges",
+                "_node_edges",
+                "_label_nodes",
+                "_name_index",
+                "_resolver",
+                "_node_embeddings",
+                "_edge_embeddings",
+                "_lock",
+                "_version",
+            ]:
+                setattr(graph, name, getattr(self, name))
+            graph._source = self
+            graph._label_sizes = {
+                label_id: len(node_ids)
+                for label_id, node_ids in self._label_nodes.items()
+            }
+        return graph
+
+    @property
+    def is_snapshot(self) -> bool:
+        return self._source is not None
+
+    def build_indexes(self) -> None:
+        if self._source is not None:
+            # the shared indexes cover at least the edges of the snapshot
+            return
+
+        with self._lock:
+            self._build_indexes()
+
+    def _build_indexes(self, edge_keys: bool = True) -> None:
+        """Index the nodes and edges added since the last call. The keys of the
+        edges are left out with `edge_keys=False`, for edges already keyed when
+        merged."""
+        # the private attributes are bound once, they are slow to access in loops
+        table: EdgeTable = self.edges
+        names = table.dictionaries["names"]
+        labels = table.dictionaries["labels"]
+        node_edges = self._node_edges
+        for name in names[len(node_edges) :]:
+            node_edges.append(array("i"))
+            self._name_index.add(name)
+
+        keys = self._edge_keys
+        node_labels = self._node_labels
+        label_nodes = self._label_nodes
+        resolver = self._resolver
+        start, columns = self._indexed_edges, table.columns
+        for edge_id, id_1, label_1, id_2, label_2, relationship in zip(
+            range(start, len(table)),
+            *(columns[name][start:] for name in COLUMNS),
+        ):
+            if edge_keys:
+                keys.add((id_1, id_2, relationship))
+            node_edges[id_1].append(edge_id)
+            if id_2 != id_1:
+                node_edges[id_2].append(edge_id)
+            for node_label in [(id_1, label_1), (id_2, label_2)]:
+                if node_label not in node_labels:
+                    node_labels.add(node_label)
+                    label_nodes.setdefault(node_label[1], array("i")).append(
+                        node_label[0]
+                    )
+                    resolver.add(names[node_label[0]], labels[node_label[1]])
+        self._indexed_edges = len(table)
+
+    def _get_edge_ids(self, node_id: int) -> Sequence[int]:
+        edge_ids = self._node_edges[node_id]
+        if self._source is not None:
+            # edge ids are appended in increasing order
+            return edge_ids[: bisect_left(edge_ids, len(self.edges))]
+        return edge_ids
+
+    def _get_label_node_ids(self, label_id: int | None) -> Sequence[int]:
+        node_ids = self._label_nodes.get(label_id, ())
+        if self._label_sizes is not None:
+            return node_ids[: self._label_sizes.get(label_id, 0)]
+        return node_ids
+
     def merge_edges(self, graph: "Graph") -> None:
-        if len(graph.edges) > 0:
-            self.edges += graph.edges
+        if self._source is not None:
+            raise TypeError("Graph snapshots are read-only")
+        # the edges of the graph are committed at once for snapshots, which are
+        # taken under the same lock
+        with self._lock:
+            self._merge_edges(graph)
 
-    def get_nodes_list(self) -> list[str]:
-        nodes = []
-        for edge in self.edges:
-            nodes.extend([edge.node_1.name, edge.node_2.name])
+    def _merge_edges(self, graph: "Graph") -> None:
+        # nodes are mapped to the canonical entity of their label and duplicated
+        # edges dropped
+        self._build_indexes()
+        table: EdgeTable = self.edges
+        other: EdgeTable = graph.edges
+        other_names = other.dictionaries["names"]
+        other_labels = other.dictionaries["labels"]
+        intern, resolve = table.intern, self._resolver.resolve
+        node_ids: dict[tuple[int, int], int] = {}
+        # in order of appearance, as the names of the other graph were interned
+        for id_1, label_1, id_2, label_2 in zip(
+            *(
+                other.columns[name]
+                for name in ["node_1", "label_1", "node_2", "label_2"]
+            )
+        ):
+            for node in [(id_1, label_1), (id_2, label_2)]:
+                if node not in node_ids:
+                    node_ids[node] = intern(
+                        "names", resolve(other_names[node[0]], other_labels[node[1]])
+                    )
+        label_ids = [intern("labels", v) for v in other_labels]
+        relationship_ids = [
+            intern("relationships", v) for v in other.dictionaries["relationships"]
+        ]
 
-        if len(nodes) == 0:
+        n_edges = len(table)
+        keys, append_ids = self._edge_keys, table.append_ids
+        for id_1, label_1, id_2, label_2, relationship in zip(
+            *(other.columns[name] for name in COLUMNS)
+        ):
+            key = (
+                node_ids[(id_1, label_1)],
+                node_ids[(id_2, label_2)],
+                relationship_ids[relationship],
+            )
+            if key not in keys:
+                keys.add(key)
+                append_ids(
+                    key[0], label_ids[label_1], key[1], label_ids[label_2], key[2]
+                )
+
+        if len(table) > n_edges:
+            self._version += 1
+            self._build_indexes(edge_keys=False)
+
+    def resolve_node_name(self, name: str) -> str:
+        self.build_indexes()
+        if self.edges.lookup("names", name) is not None:
+            return name
+        with self._lock:
+            canonical = self._resolver.lookup(name)
+        if canonical is None or self.edges.lookup("names", canonical) is None:
+            return name
+        return canonical
+
+    def get_node_aliases(self, name: str) -> list[str]:
+        self.build_indexes()
+        with self._lock:
+            aliases = list(self._resolver.aliases.items())
+        return [alias for alias, canonical in aliases if canonical == name]
+
+    def get_node_id(self, name: str) -> int | None:
+        return self.edges.lookup("names", name)
+
+    def get_nodes_list(self) -> list[str]:
+        names = self.edges.dictionaries["names"]
+        if len(names) == 0:
             return ["The graph is empty, no nodes have been created yet"]
-        return list(set(nodes))
+        return list(names)
+
+    def get_nodes_count(self) -> int:
+        return len(self.edges.dictionaries["names"])
+
+    def get_relevant_nodes(self, text: str, k: int) -> list[str]:
+        if self.get_nodes_count() <= k:
+            return self.get_nodes_list()
+
+        self.build_indexes()
+        names = self.edges.dictionaries["names"]
+        with self._lock:
+            # nodes added after a snapshot are searched too, and left out
+            results = self._name_index.search(
+                text, k + len(self._name_index) - len(names)
+            )
+        return [names[node_id] for node_id, _ in results if node_id < len(names)][:k]
+
+    def build_embeddings(self) -> None:
+        if self._source is not None:
+            return self._source.build_embeddings()
+
+        with self._lock:
+            self._build_embeddings()
+
+    def _build_embeddings(self) -> None:
+        table: EdgeTable = self.edges
+        names = table.dictionaries["names"]
+        self._node_embeddings.extend(names[len(self._node_embeddings) :])
+
+        relationships = table.dictionaries["relationships"]
+        columns = table.columns
+        self._edge_embeddings.extend(
+            [
+                f"{names[columns['node_1'][edge_id]]} "
+                f"{relationships[columns['relationship'][edge_id]]} "
+                f"{names[columns['node_2'][edge_id]]}"
+                for edge_id in range(len(self._edge_embeddings), len(table))
+            ]
+        )
+
+    def search_nodes(self, texts: list[str], k: int) -> list[list[str]]:
+        """The `k` node names most similar to each of the texts"""
+        self.build_embeddings()
+        names = self.edges.dictionaries["names"]
+        with self._lock:
+            results = self._node_embeddings.search(
+                texts, k + len(self._node_embeddings) - len(names)
+            )
+        return [
+            [names[node_id] for node_id, _ in nodes if node_id < len(names)][:k]
+            for nodes in results
+        ]
+
+    def search_edges(self, texts: list[str], k: int) -> list[list[Edge]]:
+        """The `k` edges whose nodes and relationship are most similar to each of
+        the texts"""
+        self.build_embeddings()
+        n_edges = len(self.edges)
+        with self._lock:
+            results = self._edge_embeddings.search(
+                texts, k + len(self._edge_embeddings) - n_edges
+            )
+        return [
+            [self.edges[edge_id] for edge_id, _ in edges if edge_id < n_edges][:k]
+            for edges in results
+        ]
+
+    def get_nodes_by_label(self, label: str) -> list[str]:
+        self.build_indexes()
+        names = self.edges.dictionaries["names"]
+        label_id = self.edges.lookup("labels", label)
+        return [names[node_id] for node_id in self._get_label_node_ids(label_id)]
+
+    def _get_node_edge_ids(self, name: str) -> tuple[int | None, Sequence[int]]:
+        self.build_indexes()
+        node_id = self.edges.lookup("names", name)
+        if node_id is None:
+            return None, array("i")
+        return node_id, self._get_edge_ids(node_id)
+
+    def get_node_edges(self, name: str) -> list[Edge]:
+        _, edge_ids = self._get_node_edge_ids(name)
+        return [self.edges[edge_id] for edge_id in edge_ids]
+
+    def get_node_neighbors(self, name: str) -> list[str]:
+        node_id, edge_ids = self._get_node_edge_ids(name)
+        names = self.edges.dictionaries["names"]
+        columns = self.edges.columns
+        neighbors = {}
+        for edge_id in edge_ids:
+            id_1, id_2 = columns["node_1"][edge_id], columns["node_2"][edge_id]
+            neighbors[names[id_2 if id_1 == node_id else id_1]] = None
+        return list(neighbors)
 
     def get_node_relationships(self, name: str) -> dict[str, list[str]]:
         relationships = []
         template = 'with node "{other_node}": {relationship}'
-        for edge in self.edges:
-            if (edge.node_1.name == name) or (edge.node_2.name == name):
-                relationships.append(
-                    template.format(
-                        other_node=(
-                            edge.node_2.name
-                            if edge.node_1.name == name
-                            else edge.node_1.name
-                        ),
-                        relationship=edge.relationship,
-                    )
+        node_id, edge_ids = self._get_node_edge_ids(self.resolve_node_name(name))
+        names = self.edges.dictionaries["names"]
+        relationship_texts = self.edges.dictionaries["relationships"]
+        columns = self.edges.columns
+        for edge_id in edge_ids:
+            id_1, id_2 = columns["node_1"][edge_id], columns["node_2"][edge_id]
+            relationships.append(
+                template.format(
+                    other_node=names[id_2 if id_1 == node_id else id_1],
+                    relationship=relationship_texts[columns["relationship"][edge_id]],
                 )
+            )
 
         if len(relationships) == 0:
             relationships = [f'Node "{name}" has no active relationships']
         return {name: relationships}
 
-    def to_pandas(self) -> tuple[pd.DataFrame, pd.DataFrame]:
-        nodes, edges = [], []
-        for edge in self.edges:
-            nodes.extend(
-                [
-                    [edge.node_1.label, edge.node_1.name],
-                    [edge.node_2.label, edge.node_2.name],
-                ]
-            )
-            edges.append([edge.node_1.name, edge.node_2.name, edge.relationship])
-
-        df_nodes = (
-            pd.DataFrame(columns=["label", "name"], data=nodes)
-            .value_counts()
-            .to_frame()
-            .reset_index()
-            .assign(id=lambda df: df.index)
+    def _get_node_ids(self, names: list[str]) -> list[int]:
+        self.build_indexes()
+        node_ids = {}
+        for name in names:
+            node_id = self.edges.lookup("names", self.resolve_node_name(name))
+            if node_id is not None:
+                node_ids[node_id] = None
+        return list(node_ids)
+
+    def _traverse(
+        self,
+        sources: list[int],
+        hops: int | None,
+        label_ids: set[int] | None = None,
+        target: int | None = None,
+    ) -> dict[int, int]:
+        """Breadth-first search from the source nodes up to `hops` hops, through
+        the nodes of the given labels only, stopping early once `target` is
+        reached. Returns the edge each node was reached through, -1 for sources."""
+        columns = self.edges.columns
+        allowed = None
+        if label_ids is not None:
+            allowed = set()
+            for label_id in label_ids:
+                allowed.update(self._get_label_node_ids(label_id))
+
+        parents = {node_id: -1 for node_id in sources}
+        frontier = list(parents)
+        depth = 0
+        while frontier and target not in parents and (hops is None or depth < hops):
+            depth += 1
+            next_frontier = []
+            for node_id in frontier:
+                for edge_id in self._get_edge_ids(node_id):
+                    id_1, id_2 = columns["node_1"][edge_id], columns["node_2"][edge_id]
+                    other = id_2 if id_1 == node_id else id_1
+                    if other in parents or (
+                        allowed is not None and other not in allowed
+                    ):
+                        continue
+                    parents[other] = edge_id
+                    next_frontier.append(other)
+            frontier = next_frontier
+        return parents
+
+    def get_neighborhood(
+        self, names: list[str], hops: int = 1, labels: list[str] | None = None
+    ) -> list[Edge]:
+        """Edges between the nodes within `hops` hops from any of the given nodes,
+        reached only through nodes of the given `labels` if any"""
+        label_ids = None
+        if labels is not None:
+            label_ids = {self.edges.lookup("labels", label) for label in labels}
+        nodes = self._traverse(self._get_node_ids(names), hops, label_ids)
+
+        columns = self.edges.columns
+        edge_ids = set()
+        for node_id in nodes:
+            for edge_id in self._get_edge_ids(node_id):
+                if (
+                    columns["node_1"][edge_id] in nodes
+                    and columns["node_2"][edge_id] in nodes
+                ):
+                    edge_ids.add(edge_id)
+        return [self.edges[edge_id] for edge_id in sorted(edge_ids)]
+
+    def get_shortest_path(
+        self, source: str, target: str, max_hops: int | None = None
+    ) -> list[Edge] | None:
+        """Edges of a shortest path between two nodes, regardless of the direction
+        of the edges, or None if they are not connected within `max_hops` hops"""
+        source_ids, target_ids = self._get_node_ids([source]), self._get_node_ids(
+            [target]
         )
-        df_edges = (
-            pd.DataFrame(columns=["node_1", "node_2", "relationship"], data=edges)
-            .merge(
-                df_nodes[["name", "id"]].rename(
-                    columns={"name": "node_1", "id": "id_1"}
-                ),
-                how="left",
-                on="node_1",
-            )
-            .merge(
-                df_nodes[["name", "id"]].rename(
-                    columns={"name": "node_2", "id": "id_2"}
-                ),
-                how="left",
-                on="node_2",
+        if not source_ids or not target_ids:
+            return None
+
+        target_id = target_ids[0]
+        parents = self._traverse(source_ids, max_hops, target=target_id)
+        if target_id not in parents:
+            return None
+
+        columns = self.edges.columns
+        path, node_id = [], target_id
+        while (edge_id := parents[node_id]) != -1:
+            path.append(self.edges[edge_id])
+            id_1, id_2 = columns["node_1"][edge_id], columns["node_2"][edge_id]
+            node_id = id_2 if id_1 == node_id else id_1
+        return path[::-1]
+
+    def get_node_degree(self, name: str) -> int:
+        _, edge_ids = self._get_node_edge_ids(self.resolve_node_name(name))
+        return len(edge_ids)
+
+    def get_analytics(self) -> GraphAnalytics:
+        """Metrics of the nodes of the graph, indexed by node id and cached until
+        the version changes"""
+        if self._analytics is None or self._analytics[0] != self._version:
+            columns = self.edges.columns
+            analytics = GraphAnalytics(
+                self.get_nodes_count(),
+                np.asarray(columns["node_1"], dtype=np.int64),
+                np.asarray(columns["node_2"], dtype=np.int64),
             )
-        )
+            self._analytics = (self._version, analytics)
+        return self._analytics[1]
+
+    def get_top_nodes(
+        self, k: int, label: str | None = None, by: str = "degree"
+    ) -> list[tuple[str, int]]:
+        """The `k` nodes with most relationships, or with highest PageRank with
+        `by="pagerank"`, of the given label if any, with their number of
+        relationships"""
+        self.build_indexes()
+        if label is None:
+            node_ids = np.arange(self.get_nodes_count())
+        else:
+            label_id = self.edges.lookup("labels", label)
+            node_ids = np.asarray(self._get_label_node_ids(label_id), dtype=np.int64)
+
+        analytics = self.get_analytics()
+        scores = getattr(analytics, by)[node_ids]
+        top = node_ids[np.argsort(-scores, kind="stable")[:k]]
+        names = self.edges.dictionaries["names"]
+        return [(names[node_id], int(analytics.degree[node_id])) for node_id in top]
+
+    def save(self, path: str) -> None:
+        """Write the graph to a columnar graph file. Saving again to the same file
+        only appends the edges merged since the last save."""
+        if self._file is None or self._file.path != path or not self._file.is_current():
+            self._file = GraphFile(path)
+        self._file.write(self.edges.dictionaries, self.edges.columns)
+
+    @classmethod
+    def load(cls, path: str) -> "Graph":
+        graph_file, dictionaries, columns = GraphFile.read(path)
+        graph = cls.model_construct(edges=EdgeTable(dictionaries, columns))
+        graph._file = graph_file
+        return graph
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def to_pandas(
+        self, metrics: list[str] | None = None
+    ) -> tuple["pd.DataFrame", "pd.DataFrame"]:
+        """The node and edge tables of the graph. The given `metrics` of the nodes
+        ("degree", "pagerank", "component" or "community") are added as columns of
+        the node table, and are only computed when asked for."""
+        from sumo.tables import GraphTables
+
+        if self._tables is None:
+            self._tables = GraphTables()
+        if self._pandas_cache is None or self._pandas_cache[0] != self._version:
+            tables = self._tables.to_pandas(self.edges.dictionaries, self.edges.columns)
+            self._pandas_cache = (self._version, *tables, self._tables.node_names)
+
+        _, df_nodes, df_edges, node_names = self._pandas_cache
+        df_nodes, df_edges = df_nodes.copy(deep=False), df_edges.copy(deep=False)
+        if metrics:
+            analytics = self.get_analytics()
+            for name in metrics:
+                df_nodes[name] = getattr(analytics, name)[node_names]
         return df_nodes, df_edges
 
-    def to_html(self) -> str:
+    def get_labels_list(self) -> list[str]:
+        return list(self.edges.dictionaries["labels"])
+
+    def to_html(
+        self,
+        max_nodes: int | None = None,
+        center: str | None = None,
+        hops: int = 1,
+        labels: list[str] | None = None,
+        collapse_labels: bool = False,
+        rank_by: str | None = None,
+    ) -> str:
+        """Render the graph with pyvis. For large graphs, the drawing can be limited
+        to the `max_nodes` nodes with highest degree, to the nodes within `hops`
+        hops from the `center` node and to the given `labels`, or the nodes of each
+        label can be collapsed into a single node. With `rank_by` ("degree" or
+        "pagerank"), nodes are selected and sized by that metric of the whole
+        graph."""
         if len(self.edges) == 0:
             return ""
 
-        df_nodes, df_edges = self.to_pandas()
-
-        # add a color to each label
-        _COLORS_ROTATION = [
-            "#00bfff",  # DeepSkyBlue
-            "#ff7f50",  # Coral
-            "#32cd32",  # LimeGreen
-            "#ff69b4",  # HotPink
-            "#8a2be2",  # BlueViolet
-            "#ff4500",  # OrangeRed
-            "#2e8b57",  # SeaGreen
-            "#dda0dd",  # Plum
-            "#ff6347",  # Tomato
-            "#4682b4",  # SteelBlue
-            "#9acd32",  # YellowGreen
-            "#ff1493",  # DeepPink
-            "#00ced1",  # DarkTurquoise
-            "#7b68ee",  # MediumSlateBlue
-            "#dc143c",  # Crimson
-        ]
-        colors_map = {
-            label: _COLORS_ROTATION[i % len(_COLORS_ROTATION)]
-            for i, label in enumerate(df_nodes["label"].unique())
-        }
-        df_nodes["color"] = df_nodes["label"].map(colors_map)
-
-        net = Network(notebook=False, cdn_resources="remote")
-        for _, row in df_nodes.iterrows():
-            net.add_node(
-                n_id=row["id"],
-                label=row["name"],
-                color=row["color"],
-                size=row["count"] * 10,
+        options = (
+            self._version,
+            max_nodes,
+            center,
+            hops,
+            tuple(labels or ()),
+            collapse_labels,
+            rank_by,
+        )
+        # only the last drawing is kept, as the options change with every rerun
+        if self._html_cache is not None and self._html_cache[0] == options:
+            return self._html_cache[1]
+
+        from sumo import render
+
+        df_nodes, df_edges = self.to_pandas([rank_by] if rank_by else None)
+        colors_map = render.get_colors_map(df_nodes["label"])
+
+        ranking = None
+        if rank_by is not None:
+            ranking = df_nodes[rank_by].to_numpy()
+            df_nodes["count"] = render.get_sizes(ranking)
+
+        center_ids = None
+        if center is not None:
+            name = self.resolve_node_name(center)
+            center_ids = df_nodes.index[df_nodes["name"] == name].tolist()
+        if max_nodes is not None or center_ids is not None or labels:
+            df_nodes, df_edges = render.select_subgraph(
+                df_nodes,
+                df_edges,
+                max_nodes=max_nodes,
+                center_ids=center_ids,
+                hops=hops,
+                labels=labels,
+                ranking=ranking,
             )
-        for _, row in df_edges.iterrows():
-            net.add_edge(source=row["id_1"], to=row["id_2"], label=row["relationship"])
+        if collapse_labels:
+            df_nodes, df_edges = render.collapse_labels(df_nodes, df_edges)
 
-        return net.generate_html()
+        html = render.render_html(df_nodes, df_edges, colors_map)
+        self._html_cache = (options, html)
+        return html
@@ -0,0 +1,168 @@
+import heapq
+import math
+import re
+import unicodedata
+import zlib
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+import numpy as np
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def text_terms(text: str) -> list[str]:
+    """Words of a text, plus the character trigrams of each word (prefixed by #)
+    to match inflections and partial spellings"""
+    terms = []
+    for word in _WORD_PATTERN.findall(normalize_text(text)):
+        terms.append(word)
+        padded = f" {word} "
+        terms.extend(f"#{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return terms
+
+
+class LexicalIndex:
+    """Incremental inverted index over short texts (e.g. node names), ranked
+    with BM25. Documents are identified by sequential integer ids."""
+
+    K1 = 1.2
+    B = 0.75
+    # terms found in more than this share of the documents are not scored
+    MAX_DOCUMENT_FREQUENCY = 0.25
+
+    def __init__(self) -> None:
+        self._postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self._lengths: list[int] = []
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, text: str) -> int:
+        doc_id = len(self._lengths)
+        terms = text_terms(text)
+        for term, tf in Counter(terms).items():
+            self._postings[term].append((doc_id, tf))
+        self._lengths.append(len(terms))
+        self._total_length += len(terms)
+        return doc_id
+
+    def search(self, text: str, k: int) -> list[tuple[int, float]]:
+        n_docs = len(self._lengths)
+        if n_docs == 0:
+            return []
+
+        max_df = max(1, n_docs * self.MAX_DOCUMENT_FREQUENCY)
+        avg_length = self._total_length / n_docs
+        scores = defaultdict(float)
+        for term in set(text_terms(text)):
+            postings = self._postings.get(term)
+            if not postings or (n_docs > 20 and len(postings) > max_df):
+                continue
+
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings:
+                norm = 1 - self.B + self.B * self._lengths[doc_id] / avg_length
+                scores[doc_id] += idf * tf * (self.K1 + 1) / (tf + self.K1 * norm)
+
+        return heapq.nlargest(k, scores.items(), key=itemgetter(1))
+
+
+class EmbeddingIndex:
+    """Incremental index of short texts embedded as hashed n-gram TF-IDF vectors,
+    searched by cosine similarity. Documents are identified by sequential integer
+    ids.
+
+    Documents are stored as normalized term frequencies, and weighted by the
+    inverse document frequencies of the whole index at search time, so that
+    adding documents never requires re-embedding the previous ones.
+    """
+
+    def __init__(self, dim: int = 256) -> None:
+        self.dim = dim
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._n_docs = 0
+        self._document_frequencies = np.zeros(dim, dtype=np.float64)
+        # squared vectors, to weight the norms of the documents at search time
+        self._squares = np.zeros((0, dim), dtype=np.float32)
+        self._norms_cache: tuple[int, np.ndarray, np.ndarray] | None = None
+        # hashed terms of each word seen
+        self._words: dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self._n_docs
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Normalized log term frequencies of the hashed terms of the texts"""
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            buckets = [
+                self._word_buckets(word)
+                for word in _WORD_PATTERN.findall(normalize_text(text))
+            ]
+            if buckets:
+                vectors[i] = np.bincount(np.concatenate(buckets), minlength=self.dim)
+        present = vectors > 0
+        np.log(vectors, out=vectors, where=present)
+        vectors[present] += 1
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _word_buckets(self, word: str) -> np.ndarray:
+        buckets = self._words.get(word)
+        if buckets is None:
+            buckets = self._words[word] = np.array(
+                [zlib.crc32(term.encode()) % self.dim for term in text_terms(word)]
+            )
+        return buckets
+
+    def extend(self, texts: list[str]) -> None:
+        if not texts:
+            return
+        vectors = self.embed(texts)
+        n_docs = self._n_docs + len(texts)
+        if n_docs > len(self._vectors):
+            # capacity is doubled, so that appending is amortized constant time
+            capacity = max(n_docs, 2 * len(self._vectors), 64)
+            self._vectors = np.resize(self._vectors, (capacity, self.dim))
+            self._squares = np.resize(self._squares, (capacity, self.dim))
+        self._vectors[self._n_docs : n_docs] = vectors
+        self._squares[self._n_docs : n_docs] = vectors**2
+        self._document_frequencies += np.count_nonzero(vectors, axis=0)
+        self._n_docs = n_docs
+
+    def _weights(self) -> tuple[np.ndarray, np.ndarray]:
+        """Squared inverse document frequencies and weighted document norms"""
+        if self._norms_cache is None or self._norms_cache[0] != self._n_docs:
+            idf = np.log((1 + self._n_docs) / (1 + self._document_frequencies)) + 1
+            weights = (idf**2).astype(np.float32)
+            norms = np.sqrt(self._squares[: self._n_docs] @ weights)
+            self._norms_cache = (self._n_docs, weights, np.maximum(norms, 1e-12))
+        _, weights, norms = self._norms_cache
+        return weights, norms
+
+    def search(self, texts: list[str], k: int) -> list[list[tuple[int, float]]]:
+        """The `k` documents most similar to each of the texts, with their cosine
+        similarities"""
+        if self._n_docs == 0 or k <= 0:
+            return [[] for _ in texts]
+
+        weights, norms = self._weights()
+        queries = self.embed(texts)
+        query_norms = np.sqrt(queries**2 @ weights)
+        scores = (queries * weights) @ self._vectors[: self._n_docs].T
+        scores /= np.maximum(query_norms, 1e-12)[:, None] * norms[None, :]
+
+        k = min(k, self._n_docs)
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top], kind="stable")]
+            results.append([(int(i), float(row[i])) for i in top if row[i] > 0])
+        return results
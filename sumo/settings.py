@@ -9,12 +9,61 @@ class Settings:
     """Configuration of app settings."""
 
     AGENT_STEPS_LIMIT: int = 10
-    CHUNK_TOKENS_LIMIT: int = 1000
+    # chunks fill the context window left by the prompt, unless a size is set
+    CHUNK_TOKENS_LIMIT: int | None = None
+    CHUNK_TOKENS_MIN: int = 500
+    # completion tokens of the edges extracted per token of a chunk: chunks are
+    # capped for the edges of a whole chunk to fit in the completion reserve
+    CHUNK_COMPLETION_RATIO: float = 2.0
+    LLM_CONTEXT_TOKENS: int = 16385
+    # tokens of the context window kept for the completion and the explorations
+    LLM_COMPLETION_TOKENS_RESERVE: int = 4096
+    PROMPT_EXPLORATIONS_TOKENS_RESERVE: int = 1000
+    PROMPT_NODES_LIMIT: int = 200
+    # relationships most similar to a question added to the investigation prompt
+    PROMPT_RELATIONSHIPS_LIMIT: int = 20
+    # size of the hashed embeddings of node names and relationships
+    EMBEDDING_DIM: int = 256
+    # bounds of the graph queries the agent can run as tools
+    KG_TOOL_MAX_HOPS: int = 3
+    KG_TOOL_RESULTS_LIMIT: int = 100
+    # relationships of a node returned by each exploration
+    KG_TOOL_PAGE_SIZE: int = 20
+    # trigram similarity above which two node names of the same label are the same
+    # entity, if the words they differ by are abbreviations or initials
+    ENTITY_RESOLUTION_THRESHOLD: float = 0.8
+    AGENT_MAX_WORKERS: int = 1
+    INGEST_MAX_WORKERS: int = 4
+
+    # per-chunk results of agent runs are checkpointed only when a path is set
+    CHECKPOINT_PATH: str | None = os.environ.get("CHECKPOINT_PATH")
+
+    # "document" routes a whole input once, "chunk" routes each of its chunks
+    ROUTER_MODE: str = "document"
 
     OPENAI_API_KEY: str = os.environ.get("OPENAI_API_KEY")
     OPENAI_CHAT_MODEL: str = "gpt-3.5-turbo"
 
     LLM_DEFAULT_TEMPERATURE: float = 0.5
 
+    # responses are cached on disk only when a cache path is set
+    LLM_CACHE_PATH: str | None = os.environ.get("LLM_CACHE_PATH")
+    LLM_CACHE_MAX_BYTES: int = 512 * 1024**2
+    LLM_CACHE_TTL_SECONDS: float | None = 30 * 24 * 3600
+
+    # provider limits, adjusted at runtime to the rate-limit headers received
+    LLM_REQUESTS_PER_MINUTE: int = 500
+    LLM_TOKENS_PER_MINUTE: int = 200_000
+    LLM_MAX_CONCURRENCY: int = 8
+    # completion tokens budgeted for each request before its usage is known
+    LLM_COMPLETION_TOKENS_ESTIMATE: int = 500
+    LLM_MAX_RETRIES: int = 6
+    LLM_BACKOFF_SECONDS: float = 1.0
+    LLM_BACKOFF_MAX_SECONDS: float = 60.0
+
+    # dollars per 1000 tokens of OPENAI_CHAT_MODEL, to estimate the cost of runs
+    LLM_PROMPT_COST_PER_1K_TOKENS: float = 0.0005
+    LLM_COMPLETION_COST_PER_1K_TOKENS: float = 0.0015
+
 
 config = Settings()
@@ -0,0 +1,260 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from collections.abc import Mapping, Sequence
+from itertools import accumulate, chain
+from typing import Iterator
+
+import numpy as np
+
+logger = logging.getLogger("storage")
+
+# A graph file is a magic header followed by append-only segments. Each segment
+# holds the strings added to the names, labels and relationships dictionaries
+# since the previous segment (as a json array) and then the new edges, stored
+# column by column as little-endian int32 ids into those dictionaries.
+MAGIC = b"SUMOKG\x00\x01"
+DICTIONARIES = ("names", "labels", "relationships")
+# edge columns and the dictionary their ids refer to
+COLUMNS = {
+    "node_1": "names",
+    "label_1": "labels",
+    "node_2": "names",
+    "label_2": "labels",
+    "relationship": "relationships",
+}
+
+_SEGMENT_TAG = b"SEG\x00"
+_SEGMENT_HEADER = struct.Struct("<4sIIIIQ")
+
+
+def _padding(size: int) -> int:
+    return -size % 4
+
+
+def _column_bytes(column: array) -> bytes:
+    if sys.byteorder == "big":
+        column = array("i", column)
+        column.byteswap()
+    return column.tobytes()
+
+
+class MappedColumn(Sequence):
+    """Column of ids read in place from the segments of a memory-mapped graph file,
+    followed by the ids appended to it since"""
+
+    def __init__(self, views: list[memoryview]) -> None:
+        self._views = views
+        self._starts = [0, *accumulate(len(view) for view in views)]
+        self._mapped = self._starts[-1]
+        self._tail = array("i")
+
+    def __len__(self) -> int:
+        return self._mapped + len(self._tail)
+
+    def __getitem__(self, index: int | slice) -> int | array:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return array("i", (self[i] for i in range(start, stop, step)))
+            return self._slice(start, stop)
+
+        if index < 0:
+            index += len(self)
+        if index >= self._mapped:
+            return self._tail[index - self._mapped]
+        if index < 0:
+            raise IndexError("index out of range")
+        segment = bisect_right(self._starts, index) - 1
+        return self._views[segment][index - self._starts[segment]]
+
+    def _slice(self, start: int, stop: int) -> array:
+        values = array("i")
+        first = bisect_right(self._starts, start) - 1
+        for segment in range(max(first, 0), len(self._views)):
+            offset = self._starts[segment]
+            if offset >= stop:
+                break
+            view = self._views[segment]
+            values.frombytes(view[max(start - offset, 0) : stop - offset].cast("B"))
+        if stop > self._mapped:
+            values.extend(
+                self._tail[max(start - self._mapped, 0) : stop - self._mapped]
+            )
+        return values
+
+    def __iter__(self) -> Iterator[int]:
+        return chain(*self._views, self._tail)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        values = np.concatenate(
+            [np.frombuffer(view, dtype=np.int32) for view in self._views]
+            + [np.frombuffer(self._tail, dtype=np.int32)]
+        )
+        return values if dtype is None else values.astype(dtype, copy=False)
+
+    def append(self, value: int) -> None:
+        self._tail.append(value)
+
+    def __reduce__(self) -> tuple:
+        # copied or pickled as an array, apart from the file
+        return array, ("i", self[:].tobytes())
+
+
+class MappedDictionaries(Mapping):
+    """String dictionaries of a memory-mapped graph file, decoded from its segments
+    on first access"""
+
+    def __init__(self, path: str, mm: mmap.mmap, segments: list[tuple]) -> None:
+        self._path = path
+        self._mm = mm
+        # offset and size of the strings of each segment, with its header offset
+        # and dictionary sizes
+        self._segments = segments
+        self._values: dict[str, list[str]] | None = None
+
+    def _decode(self) -> dict[str, list[str]]:
+        if self._values is None:
+            values = {name: [] for name in DICTIONARIES}
+            for offset, strings_offset, strings_size, sizes in self._segments:
+                strings = json.loads(
+                    self._mm[strings_offset : strings_offset + strings_size]
+                )
+                for name, segment_values, size in zip(DICTIONARIES, strings, sizes):
+                    if len(segment_values) != size:
+                        raise ValueError(
+                            f"{self._path} has a corrupted segment at {offset}"
+                        )
+                    values[name].extend(segment_values)
+            self._values = values
+        return self._values
+
+    def __getitem__(self, name: str) -> list[str]:
+        return self._decode()[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(DICTIONARIES)
+
+    def __len__(self) -> int:
+        return len(DICTIONARIES)
+
+    def __reduce__(self) -> tuple:
+        return dict, (dict(self._decode()),)
+
+
+class GraphFile:
+    """Columnar graph file, written incrementally by appending segments"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.size = 0
+        self.counts = {name: 0 for name in DICTIONARIES + ("edges",)}
+        # the mapping of the file read, kept open for its views
+        self._mmap: mmap.mmap | None = None
+
+    def __getstate__(self) -> dict:
+        return {**self.__dict__, "_mmap": None}
+
+    def is_current(self) -> bool:
+        return os.path.exists(self.path) and os.path.getsize(self.path) == self.size
+
+    def write(
+        self, dictionaries: dict[str, list[str]], columns: dict[str, array]
+    ) -> None:
+        """Append the dictionary entries and edges not yet written"""
+        n_edges = len(columns["node_1"])
+        if self.size > 0 and n_edges == self.counts["edges"]:
+            return
+
+        strings = json.dumps(
+            [dictionaries[name][self.counts[name] :] for name in DICTIONARIES]
+        ).encode()
+        header = _SEGMENT_HEADER.pack(
+            _SEGMENT_TAG,
+            *(len(dictionaries[name]) - self.counts[name] for name in DICTIONARIES),
+            n_edges - self.counts["edges"],
+            len(strings),
+        )
+        # a new file replaces the previous one only once written, which may still
+        # be mapped by the graph being saved
+        path = self.path if self.size > 0 else self.path + ".tmp"
+        with open(path, "r+b" if self.size > 0 else "wb") as f:
+            if self.size == 0:
+                f.write(MAGIC)
+            else:
+                # drops any incomplete segment left after the last one read
+                f.seek(self.size)
+                f.truncate()
+            f.write(header)
+            f.write(strings + b"\x00" * _padding(len(strings)))
+            for name in COLUMNS:
+                f.write(_column_bytes(columns[name][self.counts["edges"] :]))
+            f.flush()
+            os.fsync(f.fileno())
+            self.size = f.tell()
+        if path != self.path:
+            os.replace(path, self.path)
+
+        self.counts = {name: len(dictionaries[name]) for name in DICTIONARIES}
+        self.counts["edges"] = n_edges
+
+    @classmethod
+    def read(cls, path: str) -> tuple["GraphFile", Mapping, dict]:
+        """Read the segments of a file in place, memory-mapping it: the columns are
+        views of the file and the dictionaries are only decoded when first
+        accessed. A trailing segment left incomplete by an interrupted write is
+        ignored."""
+        graph_file = cls(path)
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < len(MAGIC):
+                raise ValueError(f"{path} is not a graph file")
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a graph file")
+
+        segments, views = [], {name: [] for name in COLUMNS}
+        counts = dict.fromkeys(DICTIONARIES, 0)
+        offset = len(MAGIC)
+        while offset + _SEGMENT_HEADER.size <= len(mm):
+            tag, *sizes, n_edges, strings_size = _SEGMENT_HEADER.unpack_from(mm, offset)
+            strings_offset = offset + _SEGMENT_HEADER.size
+            columns_offset = strings_offset + strings_size + _padding(strings_size)
+            end = columns_offset + 4 * n_edges * len(COLUMNS)
+            if tag != _SEGMENT_TAG:
+                raise ValueError(f"{path} has a corrupted segment at {offset}")
+            if end > len(mm):
+                logger.warning(f"Ignoring incomplete segment of {path}")
+                break
+
+            segments.append((offset, strings_offset, strings_size, sizes))
+            for name, size in zip(DICTIONARIES, sizes):
+                counts[name] += size
+            for i, name in enumerate(COLUMNS):
+                start = columns_offset + 4 * n_edges * i
+                view = memoryview(mm)[start : start + 4 * n_edges].cast("i")
+                # ids of the segment refer to the dictionaries as written so far
+                ids = np.frombuffer(view, dtype="<i4")
+                if n_edges and not 0 <= ids.min() <= ids.max() < counts[COLUMNS[name]]:
+                    raise ValueError(f"{path} references unknown {COLUMNS[name]}")
+                views[name].append(view)
+            offset = end
+
+        if sys.byteorder == "big":
+            # the file is little-endian, the columns are read into native arrays
+            columns = {name: array("i") for name in COLUMNS}
+            for name, column in columns.items():
+                for view in views[name]:
+                    column.frombytes(view)
+                column.byteswap()
+        else:
+            columns = {name: MappedColumn(views[name]) for name in COLUMNS}
+
+        graph_file.size = offset
+        graph_file.counts = {**counts, "edges": len(columns["node_1"])}
+        graph_file._mmap = mm
+        return graph_file, MappedDictionaries(path, mm, segments), columns
@@ -0,0 +1,99 @@
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from sumo.storage import COLUMNS
+
+_NAME_BITS = 32
+
+
+class GraphTables:
+    """Node and edge tables of the edge columns of a graph, updated incrementally
+    as edges are appended. Nodes are (label, name) pairs, numbered in order of
+    first appearance."""
+
+    def __init__(self) -> None:
+        self.n_edges = 0
+        self.node_labels = np.empty(0, dtype=np.int64)
+        self.node_names = np.empty(0, dtype=np.int64)
+        self.node_counts = np.empty(0, dtype=np.int64)
+        self.edge_nodes_1 = np.empty(0, dtype=np.int64)
+        self.edge_nodes_2 = np.empty(0, dtype=np.int64)
+        self._node_rows: dict[int, int] = {}
+
+    def update(self, columns: dict[str, array]) -> None:
+        n_edges = len(columns["node_1"])
+        if n_edges == self.n_edges:
+            return
+
+        new = {
+            name: np.array(columns[name][self.n_edges :], dtype=np.int64)
+            for name in COLUMNS
+        }
+        # endpoints interleaved, so that nodes are numbered in order of appearance
+        keys = np.column_stack(
+            (
+                (new["label_1"] << _NAME_BITS) | new["node_1"],
+                (new["label_2"] << _NAME_BITS) | new["node_2"],
+            )
+        ).ravel()
+        unique_keys, first_index, inverse = np.unique(
+            keys, return_index=True, return_inverse=True
+        )
+
+        # only the distinct endpoints of the new edges are looked up one by one
+        unique_rows = np.empty(len(unique_keys), dtype=np.int64)
+        added_keys = []
+        for i in np.argsort(first_index, kind="stable"):
+            key = int(unique_keys[i])
+            row = self._node_rows.get(key)
+            if row is None:
+                row = self._node_rows[key] = len(self._node_rows)
+                added_keys.append(key)
+            unique_rows[i] = row
+
+        added_keys = np.array(added_keys, dtype=np.int64)
+        self.node_labels = np.concatenate((self.node_labels, added_keys >> _NAME_BITS))
+        self.node_names = np.concatenate(
+            (self.node_names, added_keys & ((1 << _NAME_BITS) - 1))
+        )
+
+        rows = unique_rows[inverse.ravel()]
+        self.node_counts = np.bincount(rows, minlength=len(self._node_rows)) + np.pad(
+            self.node_counts, (0, len(added_keys))
+        )
+        self.edge_nodes_1 = np.concatenate((self.edge_nodes_1, rows[0::2]))
+        self.edge_nodes_2 = np.concatenate((self.edge_nodes_2, rows[1::2]))
+        self.n_edges = n_edges
+
+    def to_pandas(
+        self,
+        dictionaries: dict[str, list[str]],
+        columns: dict[str, array],
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        self.update(columns)
+        names = np.array(dictionaries["names"], dtype=object)
+        labels = np.array(dictionaries["labels"], dtype=object)
+        relationships = np.array(dictionaries["relationships"], dtype=object)
+
+        df_nodes = pd.DataFrame(
+            {
+                "label": labels[self.node_labels],
+                "name": names[self.node_names],
+                "count": self.node_counts,
+                "id": np.arange(len(self.node_counts)),
+            }
+        )
+        df_edges = pd.DataFrame(
+            {
+                "node_1": names[np.array(columns["node_1"], dtype=np.int64)],
+                "node_2": names[np.array(columns["node_2"], dtype=np.int64)],
+                "relationship": relationships[
+                    np.array(columns["relationship"], dtype=np.int64)
+                ],
+                "id_1": self.edge_nodes_1,
+                "id_2": self.edge_nodes_2,
+            }
+        )
+        return df_nodes, df_edges
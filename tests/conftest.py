@@ -0,0 +1,4 @@
+import os
+
+# the LLM clients are built without calling the API, but require a key
+os.environ.setdefault("OPENAI_API_KEY", "test")
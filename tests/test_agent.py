@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from sumo.agent import agent
+from sumo.agent.agent import LlmAgent
+from sumo.settings import config
+
+
+def test_chunks_are_capped_for_their_edges_to_fit_in_the_completion(monkeypatch):
+    monkeypatch.setattr(config, "CHUNK_TOKENS_LIMIT", None)
+    monkeypatch.setattr(config, "LLM_COMPLETION_TOKENS_RESERVE", 4096)
+    monkeypatch.setattr(config, "CHUNK_COMPLETION_RATIO", 2.0)
+    assert LlmAgent()._chunk_budget() == 2048
+
+    # a larger context window does not grow the chunks past the cap
+    monkeypatch.setattr(config, "LLM_CONTEXT_TOKENS", 128000)
+    assert LlmAgent()._chunk_budget() == 2048
+
+
+def test_chunks_fill_the_context_below_the_cap(monkeypatch):
+    monkeypatch.setattr(config, "CHUNK_TOKENS_LIMIT", None)
+    monkeypatch.setattr(config, "CHUNK_COMPLETION_RATIO", 0.1)
+    budget = LlmAgent()._chunk_budget()
+    assert (
+        config.CHUNK_TOKENS_MIN
+        < budget
+        < config.LLM_CONTEXT_TOKENS - (config.LLM_COMPLETION_TOKENS_RESERVE)
+    )
+
+
+@pytest.fixture
+def llm_routes(monkeypatch):
+    # the chunks routed by the LLM, to a direct answer
+    routed = []
+
+    def route_query(query):
+        routed.append(query)
+        return "direct_llm"
+
+    async def aroute_query(query):
+        return route_query(query)
+
+    monkeypatch.setattr(config, "ROUTER_MODE", "document")
+    monkeypatch.setattr(agent, "route_query", route_query)
+    monkeypatch.setattr(agent, "aroute_query", aroute_query)
+    return routed
+
+
+def _route(query, head, run: str) -> str:
+    if run == "run":
+        return LlmAgent()._route(query, head)
+    return asyncio.run(LlmAgent()._aroute(query, head))
+
+
+@pytest.mark.parametrize("run", ["run", "arun"])
+def test_documents_of_several_chunks_are_not_routed_by_the_llm(llm_routes, run):
+    # the second chunk is not the end of the document
+    query = "First chunk. Is this the second one? Third chunk."
+    head = ["First chunk.", "Is this the second one?"]
+    assert _route(query, head, run) == "generate_kg"
+    assert _route(iter([query]), head, run) == "generate_kg"
+    assert llm_routes == []
+
+
+@pytest.mark.parametrize("run", ["run", "arun"])
+def test_questions_of_several_chunks_are_routed_by_the_llm(llm_routes, run):
+    query = "A long context. More of it. What is it about?"
+    head = ["A long context.", "More of it."]
+    assert _route(query, head, run) == "direct_llm"
+    assert _route("A short question?", ["A short question?"], run) == "direct_llm"
+    assert llm_routes == ["A long context.", "A short question?"]
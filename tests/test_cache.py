@@ -0,0 +1,80 @@
+import sqlite3
+import time
+
+from langchain_core.outputs import Generation
+
+from sumo.agent.cache import SqliteLlmCache
+
+_LLM = "model"
+
+
+def _response(text: str) -> list[Generation]:
+    return [Generation(text=text)]
+
+
+def _size(text: str) -> int:
+    cache = SqliteLlmCache(":memory:")
+    cache.update("prompt", _LLM, _response(text))
+    return cache.stats()["bytes"]
+
+
+def test_lookup_returns_the_cached_response(tmp_path):
+    cache = SqliteLlmCache(str(tmp_path / "cache.sqlite"))
+    cache.update("prompt", _LLM, _response("answer"))
+
+    assert cache.lookup("prompt", _LLM) == _response("answer")
+    assert cache.lookup("prompt", "other model") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_expired_responses_are_dropped(tmp_path):
+    cache = SqliteLlmCache(str(tmp_path / "cache.sqlite"), ttl_seconds=0.05)
+    cache.update("prompt", _LLM, _response("answer"))
+    time.sleep(0.1)
+
+    assert cache.lookup("prompt", _LLM) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    size = _size("a" * 100)
+    cache = SqliteLlmCache(str(tmp_path / "cache.sqlite"), max_bytes=2 * size)
+    for prompt in ["first", "second"]:
+        cache.update(prompt, _LLM, _response("a" * 100))
+        time.sleep(0.01)
+    cache.lookup("first", _LLM)
+    time.sleep(0.01)
+    cache.update("third", _LLM, _response("a" * 100))
+
+    assert cache.lookup("second", _LLM) is None
+    assert cache.lookup("first", _LLM) is not None
+    assert cache.lookup("third", _LLM) is not None
+    assert cache.stats()["bytes"] == 2 * size
+
+
+def test_size_follows_replaced_and_deleted_responses(tmp_path):
+    cache = SqliteLlmCache(str(tmp_path / "cache.sqlite"))
+    cache.update("prompt", _LLM, _response("a" * 100))
+    cache.update("prompt", _LLM, _response("short"))
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"]) == (1, _size("short"))
+
+    cache.clear()
+    assert cache.stats()["bytes"] == 0
+
+
+def test_size_of_a_cache_created_without_its_counter(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+        "size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO llm_cache VALUES ('key', 'value', 5, ?, ?)",
+        (time.time(), time.time()),
+    )
+    conn.commit()
+    conn.close()
+
+    assert SqliteLlmCache(path).stats()["bytes"] == 5
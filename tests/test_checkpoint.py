@@ -0,0 +1,40 @@
+import pytest
+
+from sumo.agent.checkpoint import get_run_checkpoint
+from sumo.agent.chunking import read_text
+from sumo.schemas import Ontology
+from sumo.settings import config
+
+ONTOLOGY = Ontology(labels=["Person"], relationships=[])
+HEADER = "Confidential report, all rights reserved.\n\n"
+
+
+@pytest.fixture(autouse=True)
+def checkpoint_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CHECKPOINT_PATH", str(tmp_path / "checkpoints.db"))
+
+
+def test_runs_sharing_their_first_chunk_are_kept_apart():
+    first = get_run_checkpoint(HEADER + "Alice met Bob.", ONTOLOGY, resume=False)
+    first.save(0, HEADER, {"generation": "first"})
+    # starting the second run does not clear the checkpoints of the first
+    second = get_run_checkpoint(HEADER + "Carol met Dan.", ONTOLOGY, resume=False)
+    second.save(0, HEADER, {"generation": "second"})
+
+    resumed = get_run_checkpoint(HEADER + "Alice met Bob.", ONTOLOGY, resume=True)
+    assert resumed.get(0, HEADER) == {"generation": "first"}
+
+
+def test_file_inputs_are_hashed_as_their_text(tmp_path):
+    path = tmp_path / "input.txt"
+    path.write_text(HEADER + "Alice met Bob.", encoding="utf-8")
+    get_run_checkpoint(read_text(str(path), size=8), ONTOLOGY, False).save(
+        0, HEADER, {"generation": "file"}
+    )
+
+    resumed = get_run_checkpoint(HEADER + "Alice met Bob.", ONTOLOGY, resume=True)
+    assert resumed.get(0, HEADER) == {"generation": "file"}
+
+
+def test_inputs_read_once_are_not_checkpointed():
+    assert get_run_checkpoint(iter([HEADER]), ONTOLOGY, resume=False) is None
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from sumo import ingest
+from sumo.schemas import Edge, Graph, Node, Ontology
+
+ONTOLOGY = Ontology(labels=["Word"], relationships=[])
+
+
+@pytest.fixture(autouse=True)
+def fake_extract(monkeypatch):
+    # each document becomes a single edge between its first and last words
+    def extract(ontology, text, chunk_workers, resume):
+        words = text.split()
+        edge = Edge(
+            node_1=Node(label="Word", name=words[0]),
+            node_2=Node(label="Word", name=words[-1]),
+            relationship="follows",
+        )
+        return Graph(edges=[edge]), 1, None
+
+    monkeypatch.setattr(ingest, "_extract", extract)
+
+
+def test_malformed_lines_are_skipped(tmp_path):
+    path = tmp_path / "docs.jsonl"
+    path.write_text(
+        "\n".join(
+            [
+                json.dumps({"id": "a", "text": "alpha beta"}),
+                "{not json",
+                json.dumps({"id": "b", "body": "missing text"}),
+                json.dumps({"id": "c", "text": 42}),
+                json.dumps({"id": "d", "text": "gamma delta"}),
+            ]
+        ),
+        encoding="utf-8",
+    )
+    assert [doc_id for doc_id, _ in ingest.read_jsonl(str(path))] == ["a", "d"]
+
+
+def test_extracted_documents_are_merged_when_reading_fails():
+    def documents():
+        for i in range(5):
+            yield str(i), f"start{i} end{i}"
+        raise OSError("disk error")
+
+    kg = Graph(edges=[])
+    with pytest.raises(OSError):
+        ingest.ingest(documents(), ONTOLOGY, kg, workers=4)
+    assert len(kg.edges) == 5
+
+
+def test_resume_skips_the_documents_already_saved(tmp_path, monkeypatch):
+    extracted = []
+    extract = ingest._extract
+
+    def counting_extract(ontology, text, chunk_workers, resume):
+        extracted.append(text)
+        return extract(ontology, text, chunk_workers, resume)
+
+    monkeypatch.setattr(ingest, "_extract", counting_extract)
+    docs, output = tmp_path / "docs.jsonl", str(tmp_path / "graph.kg")
+    ontology = tmp_path / "ontology.json"
+    ontology.write_text(ONTOLOGY.model_dump_json())
+    argv = [str(docs), "--ontology", str(ontology), "--output", output]
+
+    texts = ["alpha beta", "gamma delta", "epsilon zeta"]
+    docs.write_text("\n".join(json.dumps({"text": text}) for text in texts[:2]))
+    ingest.main(argv)
+    docs.write_text("\n".join(json.dumps({"text": text}) for text in texts))
+    ingest.main(argv + ["--resume"])
+
+    assert extracted == texts
+    assert len(Graph.load(output).edges) == 3
+
+    # without resume, the output graph is built again
+    ingest.main(argv)
+    assert extracted[3:] == texts
+    assert len(Graph.load(output).edges) == 3
@@ -0,0 +1,225 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+import openai
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration
+from langchain_core.runnables import Runnable
+
+from sumo.agent.llms import GraphOutputParser, _LoopTransport
+from sumo.agent.ratelimit import BULK, INTERACTIVE, RateLimiter, ScheduledRunnable
+from sumo.settings import config
+
+_CACHE_KEY = """
+from sumo.agent.cache import SqliteLlmCache
+from sumo.agent.llms import get_llm
+
+print(SqliteLlmCache._key("prompt", get_llm()._get_llm_string()))
+"""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keeps the connections alive, so that they are pooled by the client
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_async_client_is_shared_across_event_loops(server_url):
+    client = httpx.AsyncClient(transport=_LoopTransport())
+
+    async def get() -> str:
+        return (await client.get(server_url)).text
+
+    # a chat message of the UI runs on its own event loop
+    assert [asyncio.run(get()) for _ in range(3)] == ["ok"] * 3
+
+
+def test_llm_cache_key_is_the_same_in_every_process(tmp_path, monkeypatch):
+    # the model is given the on-disk cache, as when it is used across runs
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "llm_cache.sqlite"))
+    keys = {
+        subprocess.run(
+            [sys.executable, "-c", _CACHE_KEY],
+            cwd=Path(__file__).parents[1],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        for _ in range(2)
+    }
+    assert len(keys) == 1
+
+
+_EDGE = (
+    '{"node_1": {"name": "Alice", "label": "Person"}, '
+    '"node_2": {"name": "Acme", "label": "Company"}, "relationship": "works at"}'
+)
+# cut in the middle of the second edge
+_TRUNCATED = '{"edges": [' + _EDGE + ", " + _EDGE[:40]
+
+
+def test_truncated_graph_generation_is_warned(caplog):
+    message = AIMessage(
+        content=_TRUNCATED, response_metadata={"finish_reason": "length"}
+    )
+    output = GraphOutputParser().parse_result([ChatGeneration(message=message)])
+
+    assert len(output.pydantic_object.edges) == 1
+    assert "cut at the completion limit after 1 edges" in caplog.text
+
+
+def test_truncated_graph_stream_is_warned(caplog):
+    chunks = [
+        AIMessageChunk(content=_TRUNCATED[:50]),
+        AIMessageChunk(
+            content=_TRUNCATED[50:], response_metadata={"finish_reason": "length"}
+        ),
+    ]
+    *_, output = GraphOutputParser().transform(iter(chunks))
+
+    assert len(output.pydantic_object.edges) == 1
+    assert "cut at the completion limit" in caplog.text
+
+
+def test_complete_graph_generation_is_not_warned(caplog):
+    message = AIMessage(
+        content='{"edges": [' + _EDGE + "]}",
+        response_metadata={"finish_reason": "stop"},
+    )
+    GraphOutputParser().parse_result([ChatGeneration(message=message)])
+
+    assert "cut at the completion limit" not in caplog.text
+
+
+def _connection_error() -> openai.APIConnectionError:
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://llm"))
+
+
+class _FlakyModel(Runnable):
+    """Fails its first `failures` calls, after yielding `chunks_before_failure`"""
+
+    def __init__(self, failures: int, chunks_before_failure: int = 0) -> None:
+        self.failures = failures
+        self.chunks_before_failure = chunks_before_failure
+        self.calls = 0
+
+    def invoke(self, input, config=None, **kwargs):
+        return "".join(self.stream(input, config))
+
+    def stream(self, input, config=None, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            yield from ["chunk"] * self.chunks_before_failure
+            raise _connection_error()
+        yield from ["chunk", "chunk"]
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(config, "LLM_BACKOFF_SECONDS", 0.001)
+
+
+def _wait_for(condition) -> None:
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_waiting_calls_are_scheduled_by_priority():
+    limiter = RateLimiter(max_concurrency=1)
+    limiter.acquire(1)
+    order = []
+
+    def call(priority: int) -> None:
+        limiter.acquire(1, priority)
+        order.append(priority)
+        limiter.release(1, None, sent=True)
+
+    threads = []
+    # the interactive call is queued last, behind the bulk one
+    for i, priority in enumerate([BULK, INTERACTIVE]):
+        threads.append(threading.Thread(target=call, args=(priority,)))
+        threads[-1].start()
+        _wait_for(lambda: len(limiter._waiting) == i + 1)
+    limiter.release(1, None, sent=True)
+    for thread in threads:
+        thread.join()
+
+    assert order == [INTERACTIVE, BULK]
+
+
+def test_concurrency_is_halved_and_calls_paused_on_rate_limits():
+    limiter = RateLimiter(max_concurrency=8)
+    limiter.observe(httpx.Response(429, headers={"retry-after-ms": "200"}))
+    limiter.observe(httpx.Response(429, headers={"retry-after-ms": "200"}))
+    assert limiter.concurrency == 2
+
+    start = time.monotonic()
+    limiter.acquire(1)
+    assert time.monotonic() - start >= 0.15
+
+    # and grows back with the calls that succeed
+    limiter.observe(httpx.Response(200))
+    assert limiter.concurrency == 2.5
+
+
+def test_retries_are_exhausted(no_backoff):
+    limiter = RateLimiter(max_retries=2)
+    error = _connection_error()
+    assert 0 <= limiter.retry_wait(1, error) <= 0.002
+    with pytest.raises(openai.APIConnectionError):
+        limiter.retry_wait(2, error)
+
+    model = _FlakyModel(failures=5)
+    with pytest.raises(openai.APIConnectionError):
+        ScheduledRunnable(model, limiter, BULK).invoke("prompt")
+    assert model.calls == 3
+    assert limiter.in_flight == 0
+
+
+def test_stream_failing_before_its_first_chunk_is_retried(no_backoff):
+    model = _FlakyModel(failures=1)
+    llm = ScheduledRunnable(model, RateLimiter(), BULK)
+
+    assert list(llm.stream("prompt")) == ["chunk", "chunk"]
+    assert model.calls == 2
+
+
+def test_stream_is_not_retried_after_its_first_chunk(no_backoff):
+    model = _FlakyModel(failures=1, chunks_before_failure=1)
+    limiter = RateLimiter()
+    chunks = []
+    with pytest.raises(openai.APIConnectionError):
+        for chunk in ScheduledRunnable(model, limiter, BULK).stream("prompt"):
+            chunks.append(chunk)
+
+    # the chunks already yielded cannot be taken back by a new attempt
+    assert chunks == ["chunk"]
+    assert model.calls == 1
+    assert limiter.in_flight == 0
@@ -0,0 +1,135 @@
+import asyncio
+import copy
+import json
+import pickle
+from typing import Any, AsyncIterator, Iterator
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from sumo.agent import llms
+from sumo.agent.agent import LlmAgent
+from sumo.agent.metrics import RunMetrics, record_chunk, record_step
+from sumo.agent.ratelimit import BULK, RateLimiter, ScheduledRunnable
+from sumo.settings import config
+
+_USAGE = {"prompt_tokens": 12, "completion_tokens": 3, "total_tokens": 15}
+
+
+class StreamingModel(BaseChatModel):
+    """Streams its answer in pieces, with the usage on the last one or without"""
+
+    pieces: list[str] = ["Hello", " there", ", how are you?"]
+    usage: dict | None = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "streaming-test"
+
+    def _chunks(self) -> Iterator[ChatGenerationChunk]:
+        for i, piece in enumerate(self.pieces):
+            last = i == len(self.pieces) - 1
+            metadata = {"token_usage": self.usage} if last and self.usage else {}
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(content=piece, response_metadata=metadata)
+            )
+
+    def _generate(self, messages: list[BaseMessage], *args, **kwargs) -> ChatResult:
+        message = AIMessage(content="".join(self.pieces))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, *args, **kwargs) -> Iterator[ChatGenerationChunk]:
+        yield from self._chunks()
+
+    async def _astream(self, *args, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        for chunk in self._chunks():
+            yield chunk
+
+
+class RoutingModel(BaseChatModel):
+    """Routes every query to a direct answer, with the usage of its responses"""
+
+    @property
+    def _llm_type(self) -> str:
+        return "routing-test"
+
+    def _generate(self, messages: list[BaseMessage], *args, **kwargs) -> ChatResult:
+        content = "An answer"
+        if kwargs.get("structured"):
+            content = json.dumps({"source": "direct_llm"})
+        message = AIMessage(content=content, response_metadata={"token_usage": _USAGE})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Any:
+        return self.bind(structured=True) | RunnableLambda(
+            lambda message: json.loads(message.content)
+        )
+
+
+async def _astream_step(model: BaseChatModel):
+    llm = ScheduledRunnable(model, RateLimiter(), BULK)
+    with record_chunk(0) as chunk, record_step("generate_kg") as step:
+        pieces = [chunk.content async for chunk in llm.astream("Say hello")]
+    return pieces, step, RunMetrics(chunks=[chunk])
+
+
+def test_astream_records_the_usage_of_the_streamed_message():
+    pieces, step, metrics = asyncio.run(_astream_step(StreamingModel(usage=_USAGE)))
+
+    assert pieces == ["Hello", " there", ", how are you?"]
+    assert step.llm_calls == 1
+    assert (step.prompt_tokens, step.completion_tokens) == (12, 3)
+    assert metrics.cost() > 0
+
+
+def test_astream_estimates_the_usage_missing_from_the_stream():
+    _, step, metrics = asyncio.run(_astream_step(StreamingModel()))
+
+    assert step.prompt_tokens == step.prompt_size_tokens > 0
+    assert step.completion_tokens == len("Hello there, how are you?") // 4
+    assert metrics.cost() > 0
+
+
+def test_stream_records_the_usage_of_the_streamed_message():
+    llm = ScheduledRunnable(StreamingModel(usage=_USAGE), RateLimiter(), BULK)
+    with record_chunk(0), record_step("generate_kg") as step:
+        list(llm.stream("Say hello"))
+
+    assert (step.prompt_tokens, step.completion_tokens) == (12, 3)
+
+
+def test_metrics_can_be_copied_and_pickled():
+    _, _, metrics = asyncio.run(_astream_step(StreamingModel(usage=_USAGE)))
+
+    assert copy.deepcopy(metrics) == metrics
+    assert pickle.loads(pickle.dumps(metrics)).totals() == metrics.totals()
+
+
+@pytest.fixture
+def routing_model(monkeypatch):
+    monkeypatch.setattr(config, "LLM_CACHE_PATH", None)
+    monkeypatch.setattr(config, "ROUTER_MODE", "document")
+    monkeypatch.setattr(llms, "get_llm", lambda *args, **kwargs: RoutingModel())
+    # the chains are built again with the model
+    llms.router_llm.cache_clear()
+    llms.direct_llm.cache_clear()
+    yield
+    llms.router_llm.cache_clear()
+    llms.direct_llm.cache_clear()
+
+
+@pytest.mark.parametrize("run", ["run", "arun"])
+def test_routing_of_a_document_is_recorded(routing_model, run):
+    agent = LlmAgent()
+    if run == "run":
+        state = agent.run("Hello there")
+    else:
+        state = asyncio.run(agent.arun("Hello there"))
+
+    assert state["generation"] == "An answer"
+    router = state["metrics"].totals()["router"]
+    assert router["llm_calls"] == 1
+    assert router["prompt_tokens"] == _USAGE["prompt_tokens"]
@@ -0,0 +1,78 @@
+import pytest
+
+from sumo.resolution import EntityResolver
+from sumo.schemas import Edge, Graph, Node
+
+
+@pytest.fixture
+def resolver() -> EntityResolver:
+    return EntityResolver(threshold=0.8)
+
+
+@pytest.mark.parametrize(
+    "name, variant",
+    [
+        ("Leonardo da Vinci", "leonardo  DA-VINCI"),
+        ("Università di Bologna", "Universita di Bologna"),
+        ("Banca Nazionale del Lavoro Spa", "Banca Nazionale del Lavoro S.p.A."),
+        (
+            "International Business Machines Corporation",
+            "International Business Machines Corp",
+        ),
+        (
+            "Museo Nazionale della Scienza e della Tecnologia Leonardo da Vinci",
+            "Museo Nazionale della Scienza e della Tecnologia L. da Vinci",
+        ),
+    ],
+)
+def test_resolves_variants(resolver, name, variant):
+    assert resolver.resolve(name, "Person") == name
+    assert resolver.resolve(variant, "Person") == name
+    assert resolver.lookup(variant) == name
+    assert resolver.aliases[variant] == name
+
+
+@pytest.mark.parametrize(
+    "name, other",
+    [
+        ("Alessandro Bianchini Ferraresi", "Alessandra Bianchini Ferraresi"),
+        ("Giuseppe Verdi Rossi", "Giuseppa Verdi Rossi"),
+        ("Giovanni Battista Ferrari", "Giovanni Battista Ferraris"),
+        ("Building 12 Milano Centrale", "Building 13 Milano Centrale"),
+    ],
+)
+def test_keeps_similar_names_apart(resolver, name, other):
+    assert resolver.resolve(name, "Person") == name
+    assert resolver.resolve(other, "Person") == other
+    assert resolver.lookup(other) == other
+
+
+def test_keeps_labels_apart(resolver):
+    assert resolver.resolve("Apple", "Organization") == "Apple"
+    assert resolver.resolve("apple", "Fruit") == "apple"
+    assert resolver.resolve("APPLE", "Organization") == "Apple"
+    assert resolver.resolve("Apple.", "Fruit") == "apple"
+    # the same name is the same entity, whatever its label
+    assert resolver.resolve("Apple", "Fruit") == "Apple"
+
+
+def test_merge_resolves_within_labels():
+    def edge(name_1, label_1, name_2, label_2):
+        return Edge(
+            node_1=Node(label=label_1, name=name_1),
+            node_2=Node(label=label_2, name=name_2),
+            relationship="related to",
+        )
+
+    kg = Graph(edges=[edge("Apple", "Organization", "Cupertino", "Place")])
+    kg.merge_edges(
+        Graph(
+            edges=[
+                edge("APPLE", "Organization", "Cupertino", "Place"),
+                edge("apple", "Fruit", "Cupertino", "Place"),
+            ]
+        )
+    )
+    assert kg.get_nodes_list() == ["Apple", "Cupertino", "apple"]
+    assert len(kg.edges) == 2
+    assert kg.resolve_node_name("APPLE") == "Apple"
@@ -0,0 +1,248 @@
+import copy
+import random
+import threading
+
+import numpy as np
+
+from sumo.schemas import Edge, Graph, Node
+
+
+def _edge(
+    name_1: str,
+    name_2: str,
+    relationship: str = "knows",
+    label_1: str = "Person",
+    label_2: str = "Person",
+) -> Edge:
+    return Edge(
+        node_1=Node(label=label_1, name=name_1),
+        node_2=Node(label=label_2, name=name_2),
+        relationship=relationship,
+    )
+
+
+def _random_edges(n: int, seed: int) -> list[Edge]:
+    rng = random.Random(seed)
+    labels = ["Person", "Company", "Place"]
+    edges = []
+    for _ in range(n):
+        id_1, id_2 = rng.randrange(30), rng.randrange(30)
+        edges.append(
+            _edge(
+                f"Entity {id_1}",
+                f"Entity {id_2}",
+                rng.choice(["knows", "works at", "lives in"]),
+                labels[id_1 % 3],
+                labels[id_2 % 3],
+            )
+        )
+    return edges
+
+
+# Alice - Bob - Acme - Milan, with Carol also at Acme, and Dave - Erin apart
+_COMPANY_EDGES = [
+    _edge("Alice", "Bob"),
+    _edge("Bob", "Acme", "works at", label_2="Company"),
+    _edge("Acme", "Milan", "located in", "Company", "Place"),
+    _edge("Carol", "Acme", "works at", label_2="Company"),
+    _edge("Dave", "Erin"),
+]
+
+
+def test_incremental_indexes_match_a_full_rebuild():
+    kg = Graph(edges=[])
+    for seed in range(5):
+        kg.merge_edges(Graph(edges=_random_edges(40, seed)))
+        # the indexes are built between merges, and caught up by the next ones
+        kg.get_node_edges("Entity 0")
+    full = Graph(edges=list(kg.edges))
+
+    assert kg.get_nodes_list() == full.get_nodes_list()
+    for name in full.get_nodes_list():
+        assert kg.get_node_edges(name) == full.get_node_edges(name)
+        assert kg.get_node_neighbors(name) == full.get_node_neighbors(name)
+        assert kg.get_node_degree(name) == full.get_node_degree(name)
+    for label in ["Person", "Company", "Place"]:
+        assert kg.get_nodes_by_label(label) == full.get_nodes_by_label(label)
+
+
+def test_merge_drops_duplicated_edges():
+    # with duplicates among the edges merged
+    edges = _random_edges(1000, seed=0)
+    kg = Graph(edges=[])
+    kg.merge_edges(Graph(edges=edges))
+    n_edges = len(kg.edges)
+    kg.merge_edges(Graph(edges=edges))
+
+    assert n_edges < len(edges)
+
+    assert len(kg.edges) == n_edges
+    assert len({(e.node_1.name, e.node_2.name, e.relationship) for e in kg.edges}) == (
+        n_edges
+    )
+
+
+def test_to_pandas_does_not_compute_the_node_metrics():
+    kg = Graph(edges=[_edge("Alice", "Bob"), _edge("Bob", "Carol")])
+    df_nodes, df_edges = kg.to_pandas()
+
+    assert list(df_nodes.columns) == ["label", "name", "count", "id"]
+    assert len(df_edges) == 2
+    assert kg._analytics is None
+
+
+def test_to_pandas_adds_the_requested_node_metrics():
+    kg = Graph(edges=[_edge("Alice", "Bob"), _edge("Bob", "Carol")])
+    kg.to_pandas()
+    kg.merge_edges(Graph(edges=[_edge("Dave", "Erin")]))
+    df_nodes, _ = kg.to_pandas(["degree", "component"])
+
+    degrees = dict(zip(df_nodes["name"], df_nodes["degree"]))
+    assert degrees == {"Alice": 1, "Bob": 2, "Carol": 1, "Dave": 1, "Erin": 1}
+    assert df_nodes["component"].nunique() == 2
+    # the tables cached for the version are left without the metrics
+    assert "degree" not in kg.to_pandas()[0].columns
+
+
+def test_to_html_ranks_by_a_metric():
+    kg = Graph(edges=[_edge("Alice", "Bob"), _edge("Bob", "Carol")])
+    html = kg.to_html(max_nodes=1, rank_by="pagerank")
+    assert "Bob" in html and "Alice" not in html
+    assert np.isclose(kg.get_analytics().pagerank.sum(), 1)
+
+
+def test_to_html_keeps_the_last_drawing_until_the_graph_changes():
+    kg = Graph(edges=[_edge("Alice", "Bob")])
+    html = kg.to_html()
+    assert kg.to_html() is html
+    assert "Carol" not in html
+
+    kg.to_html(max_nodes=1)
+    assert kg.to_html() is not html
+    kg.merge_edges(Graph(edges=[_edge("Bob", "Carol")]))
+    assert "Carol" in kg.to_html()
+
+
+def test_graphs_with_the_same_edges_are_equal():
+    edges = _random_edges(20, seed=0)
+    kg = Graph(edges=edges)
+    assert kg == Graph(edges=edges)
+    # whatever their indexes and caches
+    kg.get_node_edges("Entity 0")
+    assert kg == Graph(edges=edges)
+    assert kg.snapshot() == Graph(edges=edges)
+
+    assert kg != Graph(edges=edges[:-1])
+    assert kg != Graph(edges=[*edges[:-1], _edge("Alice", "Bob")])
+
+
+def test_neighborhood_is_limited_by_hops():
+    kg = Graph(edges=_COMPANY_EDGES)
+    assert kg.get_neighborhood(["Alice"], hops=1) == _COMPANY_EDGES[:1]
+    assert kg.get_neighborhood(["Alice"], hops=2) == _COMPANY_EDGES[:2]
+    assert kg.get_neighborhood(["Alice"], hops=3) == _COMPANY_EDGES[:4]
+    assert kg.get_neighborhood(["Alice", "Dave"]) == [
+        _COMPANY_EDGES[0],
+        _COMPANY_EDGES[4],
+    ]
+    assert kg.get_neighborhood(["Nobody"]) == []
+
+
+def test_neighborhood_only_goes_through_the_given_labels():
+    kg = Graph(edges=_COMPANY_EDGES)
+    assert kg.get_neighborhood(["Alice"], hops=3, labels=["Person"]) == [
+        _COMPANY_EDGES[0]
+    ]
+    # Carol is reached through Acme, but not Milan
+    assert kg.get_neighborhood(["Bob"], hops=3, labels=["Person", "Company"]) == [
+        _COMPANY_EDGES[0],
+        _COMPANY_EDGES[1],
+        _COMPANY_EDGES[3],
+    ]
+
+
+def test_shortest_path_follows_edges_in_both_directions():
+    kg = Graph(edges=_COMPANY_EDGES)
+    assert kg.get_shortest_path("Alice", "Milan") == _COMPANY_EDGES[:3]
+    assert kg.get_shortest_path("Milan", "Alice") == _COMPANY_EDGES[2::-1]
+    assert kg.get_shortest_path("Carol", "Bob") == [
+        _COMPANY_EDGES[3],
+        _COMPANY_EDGES[1],
+    ]
+
+
+def test_shortest_path_of_nodes_not_connected():
+    kg = Graph(edges=_COMPANY_EDGES)
+    assert kg.get_shortest_path("Alice", "Milan", max_hops=2) is None
+    assert kg.get_shortest_path("Alice", "Erin") is None
+    assert kg.get_shortest_path("Alice", "Nobody") is None
+
+
+def test_top_nodes_ties_keep_the_order_of_the_nodes():
+    kg = Graph(edges=_COMPANY_EDGES)
+    assert kg.get_top_nodes(2) == [("Acme", 3), ("Bob", 2)]
+    assert kg.get_top_nodes(4, label="Person") == [
+        ("Bob", 2),
+        ("Alice", 1),
+        ("Carol", 1),
+        ("Dave", 1),
+    ]
+    assert kg.get_top_nodes(1, by="pagerank") == [("Acme", 3)]
+    assert kg.get_top_nodes(5, label="Nothing") == []
+
+
+def test_snapshot_does_not_see_later_merges():
+    kg = Graph(edges=_COMPANY_EDGES[:2])
+    snapshot = kg.snapshot()
+    kg.merge_edges(Graph(edges=_COMPANY_EDGES[2:]))
+
+    assert snapshot == Graph(edges=_COMPANY_EDGES[:2])
+    assert snapshot.get_nodes_count() == 3
+    assert snapshot.get_node_edges("Acme") == [_COMPANY_EDGES[1]]
+    assert snapshot.get_shortest_path("Alice", "Milan") is None
+    assert snapshot.get_labels_list() == ["Person", "Company"]
+    assert len(kg.get_node_edges("Acme")) == 3
+
+
+def test_snapshots_are_read_while_the_graph_is_merged_into():
+    kg = Graph(edges=[])
+    errors = []
+
+    def write() -> None:
+        for seed in range(30):
+            kg.merge_edges(Graph(edges=_random_edges(20, seed)))
+
+    def read() -> None:
+        try:
+            for _ in range(30):
+                snapshot = kg.snapshot()
+                n_edges = len(snapshot.edges)
+                full = Graph(edges=list(snapshot.edges))
+                for name in ["Entity 0", "Entity 1", "Entity 2"]:
+                    assert snapshot.get_node_edges(name) == full.get_node_edges(name)
+                assert snapshot.get_top_nodes(3) == full.get_top_nodes(3)
+                assert len(snapshot.edges) == n_edges
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write)]
+    threads += [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert kg == Graph(edges=list(kg.edges))
+
+
+def test_deep_copies_have_storage_and_lock_of_their_own():
+    kg = Graph(edges=_COMPANY_EDGES[:2])
+    for graph in [copy.deepcopy(kg), kg.model_copy(deep=True)]:
+        assert graph == kg and graph._lock is not kg._lock
+        graph.merge_edges(Graph(edges=_COMPANY_EDGES[2:]))
+        assert len(kg.edges) == 2
+
+    snapshot = copy.deepcopy(kg.snapshot())
+    assert snapshot == kg
+    assert snapshot._lock is snapshot._source._lock is not kg._lock
@@ -0,0 +1,102 @@
+import pytest
+
+from sumo.agent.agent import nodes_context
+from sumo.schemas import Edge, Graph, Node
+from sumo.search import EmbeddingIndex, LexicalIndex
+from sumo.settings import config
+
+_NAMES = [
+    "Alice Smith",
+    "Bob Smith",
+    "Alice Johnson Trading Company",
+    "Acme Corporation",
+    "Museo del Novecento",
+]
+
+
+@pytest.fixture
+def lexical_index() -> LexicalIndex:
+    index = LexicalIndex()
+    for name in _NAMES:
+        index.add(name)
+    return index
+
+
+def test_bm25_ranks_shorter_documents_first(lexical_index):
+    ranked = [doc_id for doc_id, _ in lexical_index.search("Alice", 5)]
+    assert ranked == [0, 2]
+
+
+def test_bm25_sums_the_scores_of_the_query_terms(lexical_index):
+    ranked = [doc_id for doc_id, _ in lexical_index.search("alice smith", 2)]
+    assert ranked == [0, 1]
+
+
+def test_trigrams_match_misspelled_and_inflected_words(lexical_index):
+    assert {doc_id for doc_id, _ in lexical_index.search("Smth", 5)} == {0, 1}
+    assert lexical_index.search("Novecento museum", 1)[0][0] == 4
+    assert lexical_index.search("zzz", 5) == []
+
+
+def test_lexical_index_is_searched_as_it_grows(lexical_index):
+    doc_id = lexical_index.add("Zeta Holding")
+    assert [doc_id for doc_id, _ in lexical_index.search("zeta", 1)] == [doc_id]
+    assert len(lexical_index) == len(_NAMES) + 1
+
+
+@pytest.fixture
+def embedding_index() -> EmbeddingIndex:
+    index = EmbeddingIndex()
+    index.extend(_NAMES)
+    return index
+
+
+def test_embedding_index_ranks_the_most_similar_names(embedding_index):
+    results = embedding_index.search(["Bob Smyth", "Museum Novecento"], 2)
+    assert [[doc_id for doc_id, _ in row] for row in results] == [[1, 0], [4, 2]]
+    assert 0 < results[0][1][1] < results[0][0][1] <= 1
+
+
+@pytest.mark.parametrize("k", [len(_NAMES), len(_NAMES) + 10])
+def test_embedding_index_returns_at_most_all_the_documents(embedding_index, k):
+    [results] = embedding_index.search(["Alice"], k)
+    assert 0 < len(results) <= len(_NAMES)
+    assert len({doc_id for doc_id, _ in results}) == len(results)
+
+
+@pytest.mark.parametrize("k", [0, -1, -10])
+def test_embedding_index_returns_nothing_for_no_results(embedding_index, k):
+    assert embedding_index.search(["Alice", "Bob"], k) == [[], []]
+    assert EmbeddingIndex().search(["Alice"], 3) == [[]]
+
+
+def test_prompt_context_is_bounded_by_the_nodes_limit(monkeypatch):
+    monkeypatch.setattr(config, "PROMPT_NODES_LIMIT", 3)
+    kg = Graph(
+        edges=[
+            Edge(
+                node_1=Node(label="Person", name=name),
+                node_2=Node(label="Company", name=f"Company {i}"),
+                relationship="works at",
+            )
+            for i, name in enumerate(_NAMES)
+        ]
+    )
+
+    context = nodes_context(kg, "Where does Alice Smith work?")
+    assert context[0] == "Alice Smith"
+    assert len(context) == 4
+    assert context[-1] == "... and 7 other entities less related to the text"
+
+
+def test_prompt_context_lists_all_the_nodes_of_small_graphs():
+    kg = Graph(
+        edges=[
+            Edge(
+                node_1=Node(label="Person", name="Alice"),
+                node_2=Node(label="Person", name="Bob"),
+                relationship="knows",
+            )
+        ]
+    )
+    assert nodes_context(kg, "Alice") == ["Alice", "Bob"]
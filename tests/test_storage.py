@@ -0,0 +1,108 @@
+import os
+import pickle
+import struct
+
+import pytest
+
+from sumo.schemas import Edge, Graph, Node
+from sumo.storage import MappedColumn
+
+
+def _graph(*names: str) -> Graph:
+    return Graph(
+        edges=[
+            Edge(
+                node_1=Node(label="Person", name=name_1),
+                node_2=Node(label="Person", name=name_2),
+                relationship="knows",
+            )
+            for name_1, name_2 in zip(names, names[1:])
+        ]
+    )
+
+
+@pytest.fixture
+def path(tmp_path) -> str:
+    return str(tmp_path / "graph.kg")
+
+
+def test_saved_graph_is_loaded_back(path):
+    kg = _graph("Alice", "Bob", "Carol")
+    kg.save(path)
+    loaded = Graph.load(path)
+
+    assert loaded == kg
+    assert loaded.get_node_neighbors("Bob") == ["Alice", "Carol"]
+
+
+def test_loaded_graph_is_read_in_place(path):
+    _graph("Alice", "Bob", "Carol").save(path)
+    loaded = Graph.load(path)
+
+    assert isinstance(loaded.edges.columns["node_1"], MappedColumn)
+    assert loaded.edges.dictionaries._values is None
+    assert loaded.edges[1].node_2.name == "Carol"
+    # copies do not refer to the file
+    assert pickle.loads(pickle.dumps(loaded)) == loaded
+
+
+def test_saving_again_appends_a_segment(path):
+    kg = _graph("Alice", "Bob")
+    kg.save(path)
+    with open(path, "rb") as f:
+        first = f.read()
+
+    kg.merge_edges(_graph("Bob", "Carol"))
+    kg.save(path)
+    with open(path, "rb") as f:
+        assert f.read().startswith(first)
+    assert Graph.load(path) == kg
+
+
+def test_loaded_graph_appends_to_its_file(path):
+    _graph("Alice", "Bob").save(path)
+    loaded = Graph.load(path)
+    loaded.merge_edges(_graph("Bob", "Carol"))
+    loaded.save(path)
+
+    assert Graph.load(path) == _graph("Alice", "Bob", "Carol")
+
+
+def test_truncated_trailing_segment_is_ignored(path, caplog):
+    kg = _graph("Alice", "Bob")
+    kg.save(path)
+    size = os.path.getsize(path)
+    kg.merge_edges(_graph("Bob", "Carol"))
+    kg.save(path)
+    # an interrupted write
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 3)
+
+    loaded = Graph.load(path)
+    assert loaded == _graph("Alice", "Bob")
+    assert "Ignoring incomplete segment" in caplog.text
+
+    # and overwritten by the next save
+    loaded.merge_edges(_graph("Bob", "Dave"))
+    loaded.save(path)
+    assert os.path.getsize(path) > size
+    assert Graph.load(path) == _graph("Alice", "Bob", "Dave")
+
+
+def test_out_of_range_ids_are_rejected(path):
+    _graph("Alice", "Bob").save(path)
+    # the relationship id of the last edge ends the file
+    with open(path, "r+b") as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(struct.pack("<i", 7))
+
+    with pytest.raises(ValueError, match="unknown relationships"):
+        Graph.load(path)
+
+
+def test_other_files_are_rejected(path):
+    with open(path, "wb") as f:
+        f.write(b"not a graph")
+
+    with pytest.raises(ValueError, match="not a graph file"):
+        Graph.load(path)
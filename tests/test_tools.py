@@ -0,0 +1,148 @@
+import pytest
+
+from sumo.agent.tools import (
+    ExploreKgTool,
+    NeighborhoodKgTool,
+    PathKgTool,
+    TopNodesKgTool,
+)
+from sumo.schemas import Edge, Graph, Node
+from sumo.settings import config
+
+
+def _edge(name_1: str, name_2: str, label_2: str = "Person") -> Edge:
+    return Edge(
+        node_1=Node(label="Person", name=name_1),
+        node_2=Node(label=label_2, name=name_2),
+        relationship="knows" if label_2 == "Person" else "works at",
+    )
+
+
+@pytest.fixture
+def kg() -> Graph:
+    # a chain of people from Alice to Erin, some of them at Acme, and Zoe apart
+    return Graph(
+        edges=[
+            _edge("Alice", "Bob"),
+            _edge("Bob", "Carol"),
+            _edge("Carol", "Dave"),
+            _edge("Dave", "Erin"),
+            _edge("Alice", "Acme", "Company"),
+            _edge("Bob", "Acme", "Company"),
+            _edge("Zoe", "Yann"),
+        ]
+    )
+
+
+def test_neighborhood_tool_caps_the_hops(kg):
+    results = NeighborhoodKgTool(kg).run(["Alice"], hops=10)
+    key = f'Relationships within {config.KG_TOOL_MAX_HOPS} hops of "Alice"'
+    assert results[key] == [
+        '"Alice" -> "Bob": knows',
+        '"Bob" -> "Carol": knows',
+        '"Carol" -> "Dave": knows',
+        '"Alice" -> "Acme": works at',
+        '"Bob" -> "Acme": works at',
+    ]
+    assert list(NeighborhoodKgTool(kg).run(["Alice"], hops=0)) == [
+        'Relationships within 1 hops of "Alice"'
+    ]
+
+
+def test_neighborhood_tool_filters_and_limits_the_relationships(kg, monkeypatch):
+    results = NeighborhoodKgTool(kg).run(["Carol"], hops=2, labels=["Company"])
+    assert results == {
+        'Relationships within 2 hops of "Carol" through entities labelled '
+        '"Company"': ["No relationships found"]
+    }
+
+    monkeypatch.setattr(config, "KG_TOOL_RESULTS_LIMIT", 2)
+    [results] = NeighborhoodKgTool(kg).run(["Carol"], hops=2).values()
+    assert results == [
+        '"Alice" -> "Bob": knows',
+        '"Bob" -> "Carol": knows',
+        "... and 4 other results",
+    ]
+
+
+def test_path_tool(kg):
+    assert PathKgTool(kg).run("Acme", "Dave") == {
+        'Shortest path between "Acme" and "Dave"': [
+            '"Bob" -> "Acme": works at',
+            '"Bob" -> "Carol": knows',
+            '"Carol" -> "Dave": knows',
+        ]
+    }
+    assert PathKgTool(kg).run("Alice", "Zoe") == {
+        'Shortest path between "Alice" and "Zoe"': ["The entities are not connected"]
+    }
+
+
+def test_top_nodes_tool(kg, monkeypatch):
+    assert TopNodesKgTool(kg).run(k=3) == {
+        "Entities with most relationships": [
+            '"Bob": 3 relationships',
+            '"Alice": 2 relationships',
+            '"Carol": 2 relationships',
+        ]
+    }
+    assert TopNodesKgTool(kg).run(label="Company", by="pagerank") == {
+        'Entities with label "Company" most central': ['"Acme": 2 relationships']
+    }
+    assert TopNodesKgTool(kg).run(label="Place") == {
+        'Entities with label "Place" with most relationships': ["No entities found"]
+    }
+
+    monkeypatch.setattr(config, "KG_TOOL_RESULTS_LIMIT", 1)
+    [results] = TopNodesKgTool(kg).run(k=20).values()
+    assert results == ['"Bob": 3 relationships']
+
+
+@pytest.fixture
+def hub() -> Graph:
+    # 25 people known by the hub, and its employer
+    return Graph(
+        edges=[_edge("Hub", f"Person {i}") for i in range(25)]
+        + [_edge("Hub", "Acme", "Company")]
+    )
+
+
+def _explore(kg: Graph, cursor: int, query: str = "") -> list[str]:
+    return ExploreKgTool(kg, query)._explore("Hub", None, None, cursor)
+
+
+def test_explore_tool_pages_follow_each_other(hub, monkeypatch):
+    monkeypatch.setattr(config, "KG_TOOL_PAGE_SIZE", 10)
+    pages, cursor = [], 0
+    while True:
+        *page, more = _explore(hub, cursor, "Where does Hub work?")
+        pages.append(page)
+        if not more.startswith("..."):
+            pages[-1].append(more)
+            break
+        cursor += 10
+        assert more.endswith(f"explore again with cursor {cursor} to get them")
+
+    assert [len(page) for page in pages] == [10, 10, 6]
+    relationships = [line for page in pages for line in page]
+    # the most relevant first, then in the order of the edges
+    assert relationships[0] == 'with node "Acme": works at'
+    assert relationships[1:] == [f'with node "Person {i}": knows' for i in range(25)]
+
+
+def test_explore_tool_last_page(hub, monkeypatch):
+    monkeypatch.setattr(config, "KG_TOOL_PAGE_SIZE", 10)
+    assert _explore(hub, 16) == [
+        f'with node "Person {i}": knows' for i in range(16, 25)
+    ] + ['with node "Acme": works at']
+
+
+def test_explore_tool_bad_cursors(hub, monkeypatch):
+    monkeypatch.setattr(config, "KG_TOOL_PAGE_SIZE", 10)
+    tool = ExploreKgTool(hub)
+    assert tool.run(["Hub"], cursor=-5) == tool.run(["Hub"])
+    assert tool.run(["Hub"], cursor=26) == {
+        "Hub from cursor 26": [
+            'Node "Hub" has only 26 relationships, none from cursor 26'
+        ]
+    }
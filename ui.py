@@ -1,10 +1,13 @@
+import asyncio
 import logging
-import pickle
+import os
+import tempfile
 
 import streamlit as st
 import streamlit.components.v1 as components
 
 from sumo.agent import LlmAgent
+from sumo.agent.agent import AgentState
 from sumo.schemas import Graph, Ontology
 
 logging.basicConfig(level=logging.INFO)
@@ -46,12 +49,56 @@ def st_modifiable_list(name: str, options: list) -> None:
 def load_kg():
     upload = st.session_state["uploaded_file"]
     if upload:
-        st.session_state["graph"] = pickle.loads(upload.read())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "graph.kg")
+            with open(path, "wb") as f:
+                f.write(upload.read())
+            st.session_state["graph"] = Graph.load(path)
+
+
+def dump_kg(kg: Graph) -> bytes:
+    # the dump is only rebuilt when the graph changed since the last rerun
+    cache_key = (id(kg), kg.version)
+    if st.session_state.get("graph_dump_key") != cache_key:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "graph.kg")
+            kg.save(path)
+            with open(path, "rb") as f:
+                st.session_state["graph_dump"] = f.read()
+        st.session_state["graph_dump_key"] = cache_key
+    return st.session_state["graph_dump"]
+
+
+def get_agent(ontology: Ontology, kg: Graph) -> LlmAgent:
+    # the agent is reused across messages while its ontology and graph are the same
+    agent_key = (ontology.model_dump_json(), id(kg))
+    if st.session_state.get("agent_key") != agent_key:
+        st.session_state["agent"] = LlmAgent(ontology=ontology, kg=kg)
+        st.session_state["agent_key"] = agent_key
+    return st.session_state["agent"]
+
+
+async def run_agent(agent: LlmAgent, query: str, status) -> AgentState:
+    # progress is shown as each chunk of the query is merged into the graph
+    async for event in agent.astream(query):
+        if event["event"] == "edges":
+            status.write(
+                ", ".join(
+                    f"{edge.node_1.name} → {edge.node_2.name}"
+                    for edge in event["edges"]
+                )
+            )
+        elif event["event"] == "chunk":
+            status.update(
+                label=f"Processed part {event['chunk'] + 1}, "
+                f"{len(event['edges'])} new relationships"
+            )
+        elif event["event"] == "end":
+            return event["state"]
 
 
 _CONTAINER_HEIGHT = 450
 kg: Graph = st.session_state["graph"]
-kg_html = kg.to_html()
 
 st.title("Sumo Knowledge Graph")
 
@@ -70,10 +117,30 @@ with col_left:
 with col_right:
     st.subheader("Graph display")
     right_container = st.container(height=_CONTAINER_HEIGHT)
+    with st.expander("Display options"):
+        col1, col2 = st.columns(2)
+        max_nodes = col1.number_input(
+            "Max nodes (0 for all)", min_value=0, value=0, step=50
+        )
+        center = col2.text_input("Center node")
+        hops = col1.slider("Hops from center", min_value=1, max_value=3, value=1)
+        labels = col2.multiselect("Labels", kg.get_labels_list())
+        collapse_labels = col1.checkbox("Collapse labels")
+        rank_by = col2.selectbox(
+            "Rank nodes by", ["degree", "pagerank"], index=None, placeholder="Count"
+        )
+    kg_html = kg.to_html(
+        max_nodes=max_nodes or None,
+        center=center or None,
+        hops=hops,
+        labels=labels,
+        collapse_labels=collapse_labels,
+        rank_by=rank_by,
+    )
     col1, col2 = st.columns(2)
     col1.download_button("Download HTML", kg_html, "graph.html", disabled=(not kg_html))
     col2.download_button(
-        "Download KG", pickle.dumps(kg), "graph.pkl", disabled=(not kg.edges)
+        "Download KG", dump_kg(kg), "graph.kg", disabled=(not kg.edges)
     )
     _ = st.file_uploader("Import KG", on_change=load_kg, key="uploaded_file")
 
@@ -84,15 +151,15 @@ with left_container:
     if user_query:
         st.chat_message("human").markdown(user_query)
 
-        with st.spinner("I'm thinking..."):
-            agent = LlmAgent(
+        with st.status("I'm thinking...") as status:
+            agent = get_agent(
                 ontology=Ontology(
                     labels=st.session_state["ontology_labels"],
                     relationships=st.session_state["ontology_relationships"],
                 ),
                 kg=kg,
             )
-            agent_state = agent.run(user_query)
+            agent_state = asyncio.run(run_agent(agent, user_query, status))
 
             st.session_state["messages"] += [
                 ("human", user_query),